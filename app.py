@@ -1,31 +1,46 @@
 from flask import Flask, jsonify
 from flask_cors import CORS
-from ytmusicapi import YTMusic
 from routes import bp as api_bp
 from routes_entities import bp_entities
 from routes_explore import bp_explore
 from routes_youtube import bp_youtube
 from routes_jiosaavn import bp_jiosaavn
 from swagger import init_swagger
+from cache import init_cache
+from ytmusic_pool import init_ytmusic_pool
+from json_provider import init_json
+from compression import init_compression
+from warmup import init_warmup, start_warmup
+import upstreams
+from typing import Optional
 import os
 
 
 def create_app() -> Flask:
 	app = Flask(__name__)
 
+	# orjson-backed, compact JSON responses
+	init_json(app)
+
 	# Enable CORS for all domains
 	CORS(app, origins="*")
 
-	# Unauthenticated client (no OAuth or cookies)
-	# See: https://ytmusicapi.readthedocs.io/en/stable/
-	ytmusic = YTMusic()
-
 	@app.get("/health")
 	def health() -> tuple:
-		return jsonify({"status": "ok"}), 200
+		return jsonify({
+			"status": "ok",
+			"ytmusic_pool": app.config["YTMUSIC_POOL"].stats(),
+			"upstreams": upstreams.stats(),
+		}), 200
+
+	# Pool of ytmusic clients, leased per request by the routes' _client()
+	init_ytmusic_pool(app)
 
-	# Expose ytmusic instance via app context for use in other routes
-	app.config["YTMUSIC_CLIENT"] = ytmusic
+	# Shared response cache for upstream-backed read endpoints
+	init_cache(app)
+
+	# gzip/br/zstd for large responses
+	init_compression(app)
 
 	# Docs
 	init_swagger(app)
@@ -36,12 +51,35 @@ def create_app() -> Flask:
 	app.register_blueprint(bp_explore, url_prefix="/api")
 	app.register_blueprint(bp_youtube, url_prefix="/api")
 	app.register_blueprint(bp_jiosaavn, url_prefix="/api")
+
+	# Keep the endpoints index.html loads hot in the response cache
+	init_warmup(app)
 	return app
 
 
+def create_asgi_app(flask_app: Optional[Flask] = None):
+	"""ASGI entry point serving the same blueprints from an event loop.
+
+	Run with ``uvicorn --factory app:create_asgi_app``. Client connections are
+	held by the event loop, so idle and slow clients no longer occupy a worker;
+	handlers (which call the blocking upstream clients) run on a pool of
+	``ASGI_WORKERS`` threads.
+	"""
+	from a2wsgi import WSGIMiddleware
+
+	workers = int(os.environ.get("ASGI_WORKERS", 256))
+	flask_app = flask_app or app
+	start_warmup(flask_app)
+	return WSGIMiddleware(flask_app, workers=workers)
+
+
 # Module-level app for WSGI servers
 app = create_app()
 
+# Set by servers without a startup hook (waitress) that import this module only to serve it
+if os.environ.get("WARMUP_ON_START") == "1":
+	start_warmup(app)
+
 
 if __name__ == "__main__":
 	# Local dev server
@@ -0,0 +1,610 @@
+"""Shared TTL response cache for the upstream-backed read endpoints.
+
+Entries live in a pluggable backend:
+
+- ``memory`` (default): in-process LRU bounded by entry count and approximate size
+- ``sqlite``: on-disk store at ``CACHE_PATH`` (default: ``ytm-cache.sqlite3`` in ``data_dir()``)
+- ``redis``: any Redis-compatible server at ``CACHE_REDIS_URL``
+- ``none``: disable caching
+
+Per-endpoint TTLs default to ``DEFAULT_TTLS`` and can be overridden with
+``CACHE_TTL_<ENDPOINT>`` environment variables (seconds, ``0`` disables).
+
+Endpoints listed in ``DEFAULT_STALE_TTLS`` are stale-while-revalidate: once an
+entry expires it is still served (``X-Cache: STALE``) for up to
+``CACHE_STALE_<ENDPOINT>`` more seconds while a background refresh runs, and
+it stays in place when that refresh fails.
+
+Stored entries are never pickled, so a tampered store can't run code. The
+``sqlite`` backend keeps a JSON header, the body and each compressed variant
+in separate columns and reads back only the variant the request accepts;
+``redis`` stores a JSON header followed by the raw bytes (``encode_entry``).
+"""
+from flask import current_app, g, has_request_context, jsonify, request
+from singleflight import coalesce
+from projection import fields_key, parse_fields, project
+from compression import accepted_encoding, compress_all, compress_response
+from ytmusic_pool import DEFAULT_LOCALE, current_locale
+from upstreams import UpstreamUnavailable, unavailable_response
+from json_provider import RawJSON
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+import hashlib
+import json
+import os
+import sqlite3
+import struct
+import threading
+import time
+
+
+# Freshness per endpoint, in seconds
+DEFAULT_TTLS: Dict[str, int] = {
+	"songs": 6 * 3600,
+	"albums": 6 * 3600,
+	"artists": 3 * 3600,
+	"playlists": 30 * 60,
+	"charts": 60 * 60,
+	"moods": 6 * 3600,
+	"moods_playlists": 60 * 60,
+	"search": 10 * 60,
+}
+DEFAULT_TTL = 5 * 60
+
+# How long past its TTL an entry may be served while it is revalidated, in seconds
+DEFAULT_STALE_TTLS: Dict[str, int] = {
+	"charts": 24 * 3600,
+	"moods": 24 * 3600,
+	"moods_playlists": 24 * 3600,
+}
+
+HIT = "HIT"
+MISS = "MISS"
+STALE = "STALE"
+
+KEY_PREFIX = "ytm:"
+
+# WSGI environ flag that makes cached_entry skip the lookup and reload (set by the warmup scheduler)
+REFRESH_ENVIRON_KEY = "ytm.cache_refresh"
+
+# WSGI environ key of a list to which cached_entry appends when each entry it stored stops being fresh
+# (passed in by the warmup scheduler)
+CACHE_EXPIRES_ENVIRON_KEY = "ytm.cache_expires"
+
+
+# Placeholder for a value that is only decoded from the body when first used
+UNDECODED = object()
+
+
+class CacheEntry:
+	"""A cached upstream payload, its serialized JSON body (ETag, compressed variants) and the time it was stored.
+
+	Entries read back from a store only decode ``value`` from ``body`` when it is accessed.
+	"""
+
+	__slots__ = ("_value", "stored_at", "ttl", "size", "body", "etag", "encoded")
+
+	def __init__(
+		self,
+		value: Any,
+		ttl: float,
+		stored_at: Optional[float] = None,
+		size: int = 0,
+		body: Optional[bytes] = None,
+		encoded: Optional[Dict[str, bytes]] = None,
+		etag: Optional[str] = None,
+	):
+		self._value = value
+		self.ttl = ttl
+		self.stored_at = time.time() if stored_at is None else stored_at
+		self.size = size
+		self.body = body
+		if etag is None and body is not None:
+			etag = hashlib.sha1(body).hexdigest()
+		self.etag = etag
+		self.encoded = encoded or {}
+
+	@property
+	def value(self) -> Any:
+		if self._value is UNDECODED:
+			self._value = json.loads(self.body)
+		return self._value
+
+	@property
+	def age(self) -> float:
+		return max(0.0, time.time() - self.stored_at)
+
+	def is_fresh(self) -> bool:
+		return self.age < self.ttl
+
+
+
+_HEADER_LEN = struct.Struct(">I")
+
+
+def encode_entry(entry: CacheEntry) -> bytes:
+	"""Serialize ``entry`` as a length-prefixed JSON header followed by the body and its compressed variants."""
+	blobs = [entry.body or b""] + list(entry.encoded.values())
+	header = {
+		"ttl": entry.ttl,
+		"stored_at": entry.stored_at,
+		"size": entry.size,
+		"etag": entry.etag,
+		"lengths": [len(blob) for blob in blobs],
+		"encodings": list(entry.encoded),
+	}
+	if entry.body is None:
+		header["value"] = entry.value
+	raw_header = json.dumps(header, separators=(",", ":"), default=str).encode("utf-8")
+	return _HEADER_LEN.pack(len(raw_header)) + raw_header + b"".join(blobs)
+
+
+def decode_entry(raw: bytes) -> CacheEntry:
+	"""Inverse of ``encode_entry``; raises ``ValueError`` on malformed data."""
+	raw = bytes(raw)
+	(header_len,) = _HEADER_LEN.unpack_from(raw)
+	header = json.loads(raw[_HEADER_LEN.size:_HEADER_LEN.size + header_len])
+	offset = _HEADER_LEN.size + header_len
+	blobs = []
+	for length in header["lengths"]:
+		blobs.append(raw[offset:offset + length])
+		offset += length
+	if offset != len(raw) or len(blobs) != len(header["encodings"]) + 1:
+		raise ValueError("Truncated cache entry")
+	if "value" in header:
+		value, body = header["value"], None
+	else:
+		value, body = UNDECODED, RawJSON(blobs[0])
+	return CacheEntry(
+		value,
+		header["ttl"],
+		stored_at=header["stored_at"],
+		size=header["size"],
+		body=body,
+		encoded=dict(zip(header["encodings"], blobs[1:])),
+		etag=header.get("etag"),
+	)
+
+
+def data_dir() -> str:
+	"""Directory for on-disk stores: ``YTM_DATA_DIR``, else ``$XDG_CACHE_HOME/ytm`` (``~/.cache/ytm``).
+
+	Created private to the current user. A directory owned by someone else is
+	refused, since whoever controls it controls what the stores read back.
+	"""
+	path = os.environ.get("YTM_DATA_DIR") or os.path.join(
+		os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"), "ytm"
+	)
+	os.makedirs(path, mode=0o700, exist_ok=True)
+	if hasattr(os, "getuid") and os.stat(path).st_uid != os.getuid():
+		raise RuntimeError(f"Data directory {path} is not owned by the current user")
+	return path
+
+
+class NullBackend:
+	"""Backend that never stores anything."""
+
+	def get(self, key: str) -> Optional[CacheEntry]:
+		return None
+
+	def set(self, key: str, entry: CacheEntry, expire: float) -> None:
+		pass
+
+	def delete(self, key: str) -> None:
+		pass
+
+	def clear(self) -> None:
+		pass
+
+
+class MemoryBackend:
+	"""Thread-safe in-process LRU bounded by entry count and total payload size."""
+
+	def __init__(self, max_entries: int = 2048, max_bytes: int = 256 * 1024 * 1024):
+		self.max_entries = max_entries
+		self.max_bytes = max_bytes
+		self._data: "OrderedDict[str, Tuple[CacheEntry, float]]" = OrderedDict()
+		self._bytes = 0
+		self._lock = threading.Lock()
+
+	def get(self, key: str) -> Optional[CacheEntry]:
+		with self._lock:
+			item = self._data.get(key)
+			if item is None:
+				return None
+			entry, expires_at = item
+			if expires_at <= time.time():
+				self._pop(key)
+				return None
+			self._data.move_to_end(key)
+			return entry
+
+	def set(self, key: str, entry: CacheEntry, expire: float) -> None:
+		with self._lock:
+			if key in self._data:
+				self._pop(key)
+			self._data[key] = (entry, time.time() + expire)
+			self._bytes += entry.size
+			while self._data and (len(self._data) > self.max_entries or self._bytes > self.max_bytes):
+				self._pop(next(iter(self._data)))
+
+	def delete(self, key: str) -> None:
+		with self._lock:
+			if key in self._data:
+				self._pop(key)
+
+	def clear(self) -> None:
+		with self._lock:
+			self._data.clear()
+			self._bytes = 0
+
+	def _pop(self, key: str) -> None:
+		entry, _ = self._data.pop(key)
+		self._bytes -= entry.size
+
+
+class SQLiteBackend:
+	"""On-disk backend; safe to share between threads and processes.
+
+	Each row holds a JSON header (TTL, timestamps, ETag, or the value itself
+	for entries without a body), the body and one column per compressed
+	variant. ``get`` reads only the variant the current request accepts.
+	"""
+
+	VARIANTS = ("zstd", "br", "gzip")
+
+	def __init__(self, path: str):
+		self.path = path
+		self._local = threading.local()
+		conn = self._conn()
+		# Rows of the single-blob layout used before
+		conn.execute("DROP TABLE IF EXISTS cache")
+		conn.execute(
+			"CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, expires_at REAL NOT NULL, header TEXT NOT NULL, "
+			"body BLOB, zstd BLOB, br BLOB, gzip BLOB)"
+		)
+		conn.execute("CREATE INDEX IF NOT EXISTS entries_expires_at ON entries (expires_at)")
+		conn.commit()
+
+	def _conn(self) -> sqlite3.Connection:
+		conn = getattr(self._local, "conn", None)
+		if conn is None:
+			conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+			conn.execute("PRAGMA journal_mode=WAL")
+			conn.execute("PRAGMA synchronous=NORMAL")
+			self._local.conn = conn
+		return conn
+
+	def get(self, key: str) -> Optional[CacheEntry]:
+		encoding = accepted_encoding()
+		variant = encoding if encoding in self.VARIANTS else "NULL"
+		row = self._conn().execute(
+			f"SELECT header, body, {variant} FROM entries WHERE key = ? AND expires_at > ?", (key, time.time())
+		).fetchone()
+		if row is None:
+			return None
+		try:
+			header = json.loads(row[0])
+			if "value" in header:
+				value, body = header["value"], None
+			else:
+				value, body = UNDECODED, RawJSON(row[1])
+			return CacheEntry(
+				value,
+				header["ttl"],
+				stored_at=header["stored_at"],
+				size=header["size"],
+				body=body,
+				encoded={encoding: bytes(row[2])} if row[2] is not None else None,
+				etag=header.get("etag"),
+			)
+		except Exception:
+			self.delete(key)
+			return None
+
+	def set(self, key: str, entry: CacheEntry, expire: float) -> None:
+		header = {"ttl": entry.ttl, "stored_at": entry.stored_at, "size": entry.size, "etag": entry.etag}
+		if entry.body is None:
+			header["value"] = entry.value
+		conn = self._conn()
+		now = time.time()
+		conn.execute(
+			"INSERT OR REPLACE INTO entries (key, expires_at, header, body, zstd, br, gzip) VALUES (?, ?, ?, ?, ?, ?, ?)",
+			(
+				key,
+				now + expire,
+				json.dumps(header, separators=(",", ":"), default=str),
+				entry.body,
+				*(entry.encoded.get(variant) for variant in self.VARIANTS),
+			),
+		)
+		conn.execute("DELETE FROM entries WHERE expires_at <= ?", (now,))
+		conn.commit()
+
+	def delete(self, key: str) -> None:
+		conn = self._conn()
+		conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+		conn.commit()
+
+	def clear(self) -> None:
+		conn = self._conn()
+		conn.execute("DELETE FROM entries")
+		conn.commit()
+
+
+class RedisBackend:
+	"""Backend for any client exposing Redis ``get``/``set(ex=)``/``delete``/``scan_iter``."""
+
+	def __init__(self, client: Any):
+		self.client = client
+
+	@classmethod
+	def from_url(cls, url: str) -> "RedisBackend":
+		import redis  # optional dependency
+
+		return cls(redis.Redis.from_url(url))
+
+	def get(self, key: str) -> Optional[CacheEntry]:
+		try:
+			raw = self.client.get(key)
+		except Exception as e:
+			print(f"[Cache] redis get failed: {e}")
+			return None
+		if raw is None:
+			return None
+		try:
+			return decode_entry(raw)
+		except Exception:
+			return None
+
+	def set(self, key: str, entry: CacheEntry, expire: float) -> None:
+		try:
+			self.client.set(key, encode_entry(entry), ex=max(1, int(expire)))
+		except Exception as e:
+			print(f"[Cache] redis set failed: {e}")
+
+	def delete(self, key: str) -> None:
+		try:
+			self.client.delete(key)
+		except Exception as e:
+			print(f"[Cache] redis delete failed: {e}")
+
+	def clear(self) -> None:
+		for key in self.client.scan_iter(f"{KEY_PREFIX}*"):
+			self.client.delete(key)
+
+
+class ResponseCache:
+	"""Front for a cache backend that knows about endpoints and their TTLs."""
+
+	def __init__(
+		self,
+		backend: Any,
+		ttls: Optional[Dict[str, int]] = None,
+		stale_ttls: Optional[Dict[str, int]] = None,
+		default_ttl: int = DEFAULT_TTL,
+		cache_controls: Optional[Dict[str, str]] = None,
+	):
+		self.backend = backend
+		self.ttls = dict(DEFAULT_TTLS if ttls is None else ttls)
+		self.stale_ttls = dict(DEFAULT_STALE_TTLS if stale_ttls is None else stale_ttls)
+		self.default_ttl = default_ttl
+		self.cache_controls = dict(cache_controls or {})
+
+	def ttl_for(self, endpoint: str) -> int:
+		return self.ttls.get(endpoint, self.default_ttl)
+
+	def stale_ttl_for(self, endpoint: str) -> int:
+		return self.stale_ttls.get(endpoint, 0)
+
+	def cache_control_for(self, endpoint: str) -> str:
+		"""``Cache-Control`` for responses of ``endpoint``, derived from its TTLs unless overridden."""
+		override = self.cache_controls.get(endpoint)
+		if override:
+			return override
+		ttl = self.ttl_for(endpoint)
+		if ttl <= 0:
+			return "no-cache"
+		# Downstream caches subtract the Age header, so max-age is the full TTL
+		directives = ["public", f"max-age={ttl}"]
+		stale_ttl = self.stale_ttl_for(endpoint)
+		if stale_ttl > 0:
+			directives += [f"stale-while-revalidate={stale_ttl}", f"stale-if-error={stale_ttl}"]
+		return ", ".join(directives)
+
+	@staticmethod
+	def make_key(endpoint: str, params: Dict[str, Any]) -> str:
+		raw = json.dumps(params, sort_keys=True, separators=(",", ":"), default=str)
+		digest = hashlib.sha1(raw.encode("utf-8")).hexdigest()
+		return f"{KEY_PREFIX}{endpoint}:{digest}"
+
+	def get(self, key: str, allow_stale: bool = False) -> Optional[CacheEntry]:
+		entry = self.backend.get(key)
+		if entry is None or not (allow_stale or entry.is_fresh()):
+			return None
+		return entry
+
+	def set(
+		self,
+		key: str,
+		value: Any,
+		ttl: float,
+		stale_ttl: float = 0,
+		body: Optional[bytes] = None,
+		encoded: Optional[Dict[str, bytes]] = None,
+	) -> CacheEntry:
+		size = len(body) if body is not None else _estimate_size(value)
+		size += sum(len(data) for data in (encoded or {}).values())
+		entry = CacheEntry(value, ttl, size=size, body=body, encoded=encoded)
+		if ttl > 0:
+			self.backend.set(key, entry, ttl + stale_ttl)
+		return entry
+
+
+def _estimate_size(value: Any) -> int:
+	try:
+		return len(json.dumps(value, separators=(",", ":"), default=str))
+	except Exception:
+		return 0
+
+
+def _build_backend(kind: str) -> Any:
+	if kind == "none":
+		return NullBackend()
+	if kind == "sqlite":
+		return SQLiteBackend(os.environ.get("CACHE_PATH") or os.path.join(data_dir(), "ytm-cache.sqlite3"))
+	if kind == "redis":
+		return RedisBackend.from_url(os.environ.get("CACHE_REDIS_URL", "redis://localhost:6379/0"))
+	return MemoryBackend(
+		max_entries=int(os.environ.get("CACHE_MAX_ENTRIES", 2048)),
+		max_bytes=int(os.environ.get("CACHE_MAX_MB", 256)) * 1024 * 1024,
+	)
+
+
+def _env_overrides(defaults: Dict[str, int], prefix: str) -> Dict[str, int]:
+	values = dict(defaults)
+	for endpoint in list(values):
+		override = os.environ.get(f"{prefix}{endpoint.upper()}")
+		if override is not None:
+			values[endpoint] = int(override)
+	return values
+
+
+def init_cache(app) -> None:
+	"""Attach the shared response cache to ``app`` (configured from the environment)."""
+	ttls = _env_overrides(DEFAULT_TTLS, "CACHE_TTL_")
+	stale_ttls = _env_overrides(DEFAULT_STALE_TTLS, "CACHE_STALE_")
+	cache_controls = {
+		endpoint: os.environ[f"CACHE_CONTROL_{endpoint.upper()}"]
+		for endpoint in DEFAULT_TTLS
+		if os.environ.get(f"CACHE_CONTROL_{endpoint.upper()}")
+	}
+	backend = _build_backend(os.environ.get("CACHE_BACKEND", "memory").lower())
+	app.config["RESPONSE_CACHE"] = ResponseCache(backend, ttls, stale_ttls, cache_controls=cache_controls)
+
+
+def get_cache() -> ResponseCache:
+	return current_app.config["RESPONSE_CACHE"]
+
+
+def _store(cache: ResponseCache, key: str, endpoint: str, value: Any) -> CacheEntry:
+	# Serialize and compress once at store time so hits are served without re-encoding
+	body = current_app.json.raw(value)
+	return cache.set(
+		key,
+		value,
+		cache.ttl_for(endpoint),
+		cache.stale_ttl_for(endpoint),
+		body=body,
+		encoded=compress_all(body),
+	)
+
+
+# Background revalidation of stale entries, at most one refresh per key at a time
+_revalidate_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="cache-revalidate")
+_revalidating = set()
+_revalidating_lock = threading.Lock()
+
+
+def _revalidate(cache: ResponseCache, key: str, endpoint: str, loader: Callable[[], Any]) -> None:
+	with _revalidating_lock:
+		if key in _revalidating:
+			return
+		_revalidating.add(key)
+	app = current_app._get_current_object()
+	locale = current_locale()
+
+	def refresh():
+		try:
+			with app.app_context():
+				g.ytmusic_locale = locale
+				_store(cache, key, endpoint, loader())
+		except Exception as e:
+			print(f"[Cache] revalidating {endpoint} failed, still serving stale: {e}")
+		finally:
+			with _revalidating_lock:
+				_revalidating.discard(key)
+
+	_revalidate_pool.submit(refresh)
+
+
+def cached_entry(
+	endpoint: str, params: Dict[str, Any], loader: Callable[[], Any], allow_stale: bool = True
+) -> Tuple[CacheEntry, str]:
+	"""Return ``(entry, state)`` for ``endpoint``/``params``; ``state`` is HIT, STALE or MISS.
+
+	Concurrent misses for the same key share a single ``loader`` call. Stale
+	entries of stale-while-revalidate endpoints are returned immediately and
+	refreshed in the background, unless ``allow_stale`` is false, in which case
+	they are reloaded like a miss. Exceptions raised by ``loader`` on a miss
+	propagate and nothing is cached. Requests carrying ``REFRESH_ENVIRON_KEY``
+	always reload. Requests for a non-default ``hl``/``gl`` locale are cached
+	separately.
+	"""
+	cache = get_cache()
+	locale = current_locale()
+	if locale != DEFAULT_LOCALE:
+		params = {**params, "hl": locale[0], "gl": locale[1]}
+	key = cache.make_key(endpoint, params)
+	refresh = has_request_context() and request.environ.get(REFRESH_ENVIRON_KEY, False)
+	entry = None if refresh else cache.get(key, allow_stale=allow_stale)
+	if entry is not None:
+		if entry.is_fresh():
+			return entry, HIT
+		_revalidate(cache, key, endpoint, loader)
+		return entry, STALE
+
+	def load():
+		# A flight for this key may have stored its result between our lookup and joining
+		if not refresh:
+			stored = cache.get(key)
+			if stored is not None:
+				return stored, HIT
+		return _store(cache, key, endpoint, loader()), MISS
+
+	entry, state = coalesce(key, load)
+	expiries = request.environ.get(CACHE_EXPIRES_ENVIRON_KEY) if refresh else None
+	if expiries is not None and entry.ttl > 0:
+		expiries.append(entry.stored_at + entry.ttl)
+	return entry, state
+
+
+def cached_value(endpoint: str, params: Dict[str, Any], loader: Callable[[], Any]) -> Tuple[Any, bool]:
+	"""Return ``(value, cached)`` for ``endpoint``/``params``, calling ``loader`` on a miss."""
+	entry, state = cached_entry(endpoint, params, loader)
+	return entry.value, state != MISS
+
+
+def cached_json(endpoint: str, params: Dict[str, Any], loader: Callable[[], Any], fields: Optional[str] = None):
+	"""JSON response for ``loader()`` served through the response cache.
+
+	Sets ``X-Cache``/``Age``, ``Cache-Control``, ``Last-Modified`` and an ``ETag``
+	hashed once per cached body; matching conditional requests get a 304. Large
+	bodies are sent in the stored compressed variant the client accepts. When
+	the upstream is shedding load and nothing is cached, returns a 503.
+	With ``fields`` (see ``projection``) the response is projected from the
+	cached full payload and the projection is cached under its own key.
+	"""
+	tree = parse_fields(fields)
+	if tree is not None:
+		full_params, full_loader = params, loader
+		params = {**params, "fields": fields_key(tree)}
+		# A stale full payload would be stored as a fresh projection, so project a fresh one only
+		loader = lambda: project(cached_entry(endpoint, full_params, full_loader, allow_stale=False)[0].value, tree)
+	try:
+		entry, state = cached_entry(endpoint, params, loader)
+	except UpstreamUnavailable as e:
+		return unavailable_response(e)
+	if entry.body is None:
+		# Entry stored without a body (e.g. by an older version)
+		entry = CacheEntry(entry.value, entry.ttl, entry.stored_at, entry.size, current_app.json.raw(entry.value))
+	resp = jsonify(entry.body)
+	resp.set_etag(entry.etag)
+	resp.last_modified = entry.stored_at
+	resp.headers["Cache-Control"] = get_cache().cache_control_for(endpoint)
+	resp.headers["X-Cache"] = state
+	if state != MISS:
+		resp.headers["Age"] = str(int(entry.age))
+	compress_response(resp, entry.body, entry.encoded)
+	return resp.make_conditional(request)
@@ -0,0 +1,104 @@
+"""Negotiated response compression (zstd, brotli, gzip).
+
+Responses of at least ``COMPRESS_MIN_BYTES`` (default 1024) with a textual
+mimetype are compressed in the best encoding the client accepts. Cached
+payloads are compressed once, when they are stored (``compress_all``), and
+served from those bytes on every hit. brotli and zstd are used when the
+``brotli`` / ``zstandard`` packages are installed; gzip always works.
+
+- ``COMPRESS_MIN_BYTES``: smallest body worth compressing
+- ``COMPRESS_ENCODINGS``: comma-separated encodings in server preference order (default ``zstd,br,gzip``)
+"""
+from flask import has_request_context, request
+from typing import Dict, Optional
+import gzip
+import os
+
+try:
+	import brotli
+except ImportError:  # pragma: no cover - optional dependency
+	brotli = None
+
+try:
+	import zstandard
+except ImportError:  # pragma: no cover - optional dependency
+	zstandard = None
+
+
+MIN_BYTES = int(os.environ.get("COMPRESS_MIN_BYTES", 1024))
+
+COMPRESSIBLE_MIMETYPES = {
+	"application/json",
+	"application/x-ndjson",
+	"application/javascript",
+	"text/html",
+	"text/plain",
+	"text/css",
+}
+
+# Moderate levels: high ratio for JSON at a few ms per 100 KB
+_COMPRESSORS = {"gzip": lambda data: gzip.compress(data, compresslevel=6, mtime=0)}
+if brotli is not None:
+	_COMPRESSORS["br"] = lambda data: brotli.compress(data, quality=5)
+if zstandard is not None:
+	_COMPRESSORS["zstd"] = lambda data: zstandard.ZstdCompressor(level=6).compress(data)
+
+ENCODINGS = [
+	encoding.strip()
+	for encoding in os.environ.get("COMPRESS_ENCODINGS", "zstd,br,gzip").split(",")
+	if encoding.strip() in _COMPRESSORS
+]
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+	return _COMPRESSORS[encoding](data)
+
+
+def compress_all(data: bytes) -> Dict[str, bytes]:
+	"""``data`` in every enabled encoding, or nothing when it is below the size threshold."""
+	if len(data) < MIN_BYTES:
+		return {}
+	return {encoding: compress(data, encoding) for encoding in ENCODINGS}
+
+
+def accepted_encoding() -> Optional[str]:
+	"""Best enabled encoding the current request accepts, if any."""
+	if not ENCODINGS or not has_request_context():
+		return None
+	return request.accept_encodings.best_match(ENCODINGS)
+
+
+def compress_response(resp, body: bytes, encoded: Optional[Dict[str, bytes]] = None):
+	"""Replace ``resp``'s data (``body``) with its best accepted encoding, preferring ``encoded`` variants."""
+	if len(body) < MIN_BYTES or not ENCODINGS:
+		return resp
+	resp.vary.add("Accept-Encoding")
+	encoding = accepted_encoding()
+	if encoding is None:
+		return resp
+	data = (encoded or {}).get(encoding)
+	if data is None:
+		data = compress(body, encoding)
+	resp.set_data(data)
+	resp.headers["Content-Encoding"] = encoding
+	# Each representation needs its own validator
+	etag, weak = resp.get_etag()
+	if etag:
+		resp.set_etag(f"{etag}-{encoding}", weak)
+	return resp
+
+
+def init_compression(app) -> None:
+	"""Compress eligible responses of ``app`` that aren't compressed already."""
+
+	@app.after_request
+	def compress_after_request(resp):
+		if (
+			resp.status_code != 200
+			or resp.direct_passthrough
+			or resp.is_streamed
+			or "Content-Encoding" in resp.headers
+			or resp.mimetype not in COMPRESSIBLE_MIMETYPES
+		):
+			return resp
+		return compress_response(resp, resp.get_data())
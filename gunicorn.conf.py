@@ -0,0 +1,81 @@
+"""Gunicorn settings for the multi-process (pre-fork) serving mode.
+
+Run with ``gunicorn -c gunicorn.conf.py app:app`` (``SERVER_MODE=gunicorn`` in
+Docker). Every worker is a separate process with its own GIL, so JSON encoding
+and response parsing use all cores. With more than one worker the response
+cache defaults to the shared on-disk SQLite backend, and only one worker at a
+time runs the warmup scheduler. ``kill -HUP <master pid>`` replaces the workers
+gracefully, letting in-flight requests finish.
+
+- ``WEB_CONCURRENCY``: worker processes (default: CPUs available to the container, at most 4)
+- ``GUNICORN_THREADS``: request threads per worker (default 32)
+- ``GUNICORN_TIMEOUT``: seconds before a stuck worker is restarted (default 60)
+- ``GUNICORN_GRACEFUL_TIMEOUT``: seconds workers get to finish on reload/shutdown (default 30)
+- ``GUNICORN_MAX_REQUESTS``: recycle a worker after this many requests, 0 = never (default 0)
+"""
+import math
+import multiprocessing
+import os
+
+
+# Each worker holds its own thread pool and YTMusic clients, so don't fork one per host CPU
+MAX_DEFAULT_WORKERS = 4
+
+
+def _cgroup_cpu_quota():
+	"""CPU limit set by the container's cgroup (v2 ``cpu.max`` or v1 CFS quota), or None."""
+	try:
+		with open("/sys/fs/cgroup/cpu.max") as f:
+			quota, period = f.read().split()[:2]
+		return None if quota == "max" else int(quota) / int(period)
+	except (OSError, ValueError):
+		pass
+	try:
+		with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as f:
+			quota = int(f.read())
+		with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as f:
+			period = int(f.read())
+		return None if quota <= 0 else quota / period
+	except (OSError, ValueError):
+		return None
+
+
+def available_cpus() -> int:
+	"""CPUs this process may run on: its affinity mask, capped by any cgroup quota."""
+	try:
+		cpus = len(os.sched_getaffinity(0))
+	except AttributeError:  # not available on macOS
+		cpus = multiprocessing.cpu_count()
+	quota = _cgroup_cpu_quota()
+	if quota is not None:
+		cpus = min(cpus, max(1, math.ceil(quota)))
+	return cpus
+
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 7860)}"
+workers = int(os.environ.get("WEB_CONCURRENCY", min(available_cpus(), MAX_DEFAULT_WORKERS)))
+worker_class = "gthread"
+threads = int(os.environ.get("GUNICORN_THREADS", 32))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 60))
+graceful_timeout = int(os.environ.get("GUNICORN_GRACEFUL_TIMEOUT", 30))
+keepalive = 5
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", 0))
+max_requests_jitter = max_requests // 10
+
+# Each worker imports the app itself, so no threads or SQLite connections cross a fork
+preload_app = False
+
+# Separate in-memory caches would each miss on their own; share one on disk instead.
+# Workers inherit the environment of the master, which reads this file.
+if workers > 1:
+	os.environ.setdefault("CACHE_BACKEND", "sqlite")
+if os.environ.get("CACHE_BACKEND", "memory").lower() in ("sqlite", "redis"):
+	# The cache is shared, so one worker warming it is enough
+	os.environ.setdefault("WARMUP_LOCK", "/tmp/ytm-warmup.lock")
+
+
+def post_worker_init(worker):
+	# Each worker warms from its own process once the app is loaded (the lock file picks one when shared)
+	from warmup import start_warmup
+
+	start_warmup(worker.wsgi)
@@ -0,0 +1,104 @@
+"""Hedged calls across interchangeable upstream endpoints.
+
+``HedgedGroup.call`` starts the healthiest endpoint first and, if it has not
+answered within ``delay`` seconds (or fails), starts the next one while the
+first keeps running. The first valid answer wins; slower attempts finish in
+the background and only update endpoint health, which orders later calls.
+"""
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import threading
+import time
+
+
+class EndpointHealth:
+	"""Exponentially weighted latency and failure rate of one endpoint."""
+	__slots__ = ("latency", "failure_rate", "calls")
+
+	ALPHA = 0.2
+
+	def __init__(self):
+		self.latency = 0.0
+		self.failure_rate = 0.0
+		self.calls = 0
+
+	def record(self, ok: bool, elapsed: float) -> None:
+		if self.calls == 0:
+			self.latency = elapsed
+			self.failure_rate = 0.0 if ok else 1.0
+		else:
+			self.latency += self.ALPHA * (elapsed - self.latency)
+			self.failure_rate += self.ALPHA * ((0.0 if ok else 1.0) - self.failure_rate)
+		self.calls += 1
+
+	def score(self) -> float:
+		"""Lower is better; failures weigh much more than latency."""
+		return self.latency * (1 + 4 * self.failure_rate) + self.failure_rate
+
+	def to_dict(self) -> Dict[str, Any]:
+		return {
+			"latency_ms": int(self.latency * 1000),
+			"failure_rate": round(self.failure_rate, 3),
+			"calls": self.calls,
+		}
+
+
+class HedgedGroup:
+	"""Races a set of named attempts with staggered starts, preferring healthy endpoints."""
+
+	def __init__(self, name: str, delay: float = 0.075, deadline: float = 1.0, workers: int = 32):
+		self.name = name
+		self.delay = delay
+		self.deadline = deadline
+		self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"hedge-{name}")
+		self._health: Dict[str, EndpointHealth] = {}
+		self._lock = threading.Lock()
+
+	def ordered(self, names: List[str]) -> List[str]:
+		"""``names`` sorted by health; untried endpoints rank as if they answered within ``delay``."""
+		with self._lock:
+			scores = {name: self._health[name].score() if name in self._health else self.delay for name in names}
+		return sorted(names, key=lambda name: scores[name])
+
+	def _attempt(self, name: str, fn: Callable[[], Optional[Any]]) -> Optional[Any]:
+		t0 = time.monotonic()
+		try:
+			value = fn()
+		except Exception as e:
+			print(f"[Hedge:{self.name}] {name} failed: {e}")
+			value = None
+		with self._lock:
+			self._health.setdefault(name, EndpointHealth()).record(value is not None, time.monotonic() - t0)
+		return value
+
+	def call(self, attempts: Dict[str, Callable[[], Optional[Any]]]) -> Tuple[Optional[Any], Optional[str]]:
+		"""Return ``(value, endpoint)`` of the first attempt to return non-None, or ``(None, None)``.
+
+		Attempts signal failure by returning None or raising. Gives up after
+		``deadline`` seconds even if attempts are still running.
+		"""
+		order = self.ordered(list(attempts))
+		deadline = time.monotonic() + self.deadline
+		names = {}
+		pending = set()
+		launched = 0
+		while True:
+			if launched < len(order):
+				name = order[launched]
+				future = self._pool.submit(self._attempt, name, attempts[name])
+				names[future] = name
+				pending.add(future)
+				launched += 1
+			remaining = deadline - time.monotonic()
+			if remaining <= 0 or not pending:
+				return None, None
+			timeout = min(self.delay, remaining) if launched < len(order) else remaining
+			done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+			for future in done:
+				value = future.result()
+				if value is not None:
+					return value, names[future]
+
+	def stats(self) -> Dict[str, Dict[str, Any]]:
+		with self._lock:
+			return {name: health.to_dict() for name, health in self._health.items()}
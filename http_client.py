@@ -0,0 +1,98 @@
+"""Shared, connection-pooled HTTP sessions for outbound upstream calls.
+
+One ``requests.Session`` is kept per upstream host so TCP/TLS connections are
+reused across requests and threads. Failed connections and 5xx responses are
+retried for idempotent methods only; other methods retry when the call site
+passes ``retry=True``, and ``retry=False`` disables retries altogether. Read
+timeouts and 429s are never retried: a retry would hold the request thread for
+another full timeout (or the upstream's Retry-After), and rate limits are left
+to the circuit breakers in ``upstreams``. Tunable through the environment:
+
+- ``HTTP_POOL_SIZE``: connections kept alive per host (default 32)
+- ``HTTP_RETRIES``: retries on connection errors and 5xx responses (default 2)
+- ``HTTP_BACKOFF``: exponential backoff factor between retries in seconds (default 0.2)
+"""
+from requests.adapters import HTTPAdapter
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlsplit
+from urllib3.util import Retry
+from urllib3.util.request import ACCEPT_ENCODING
+import os
+import requests
+import threading
+
+
+RETRY_STATUSES = (500, 502, 503, 504)
+
+
+class SessionManager:
+	"""Thread-safe registry of pooled sessions keyed by ``scheme://host`` and retry policy."""
+
+	def __init__(self, pool_size: int = 32, retries: int = 2, backoff: float = 0.2):
+		self.pool_size = pool_size
+		self.retries = retries
+		self.backoff = backoff
+		self._sessions: Dict[Tuple[str, Optional[bool]], requests.Session] = {}
+		self._lock = threading.Lock()
+
+	def _new_session(self, retry: Optional[bool]) -> requests.Session:
+		if retry is False:
+			max_retries = Retry(total=0, read=0, redirect=0, raise_on_status=False)
+		else:
+			allowed_methods = Retry.DEFAULT_ALLOWED_METHODS
+			if retry:
+				allowed_methods = allowed_methods | {"POST"}
+			max_retries = Retry(
+				total=self.retries,
+				connect=self.retries,
+				read=0,
+				status=self.retries,
+				backoff_factor=self.backoff,
+				status_forcelist=RETRY_STATUSES,
+				allowed_methods=allowed_methods,
+				respect_retry_after_header=False,
+				raise_on_status=False,
+			)
+		adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, max_retries=max_retries, pool_block=False)
+		session = requests.Session()
+		session.mount("https://", adapter)
+		session.mount("http://", adapter)
+		# urllib3 transparently decodes every encoding it advertises (gzip/deflate, plus br/zstd when installed)
+		session.headers["Accept-Encoding"] = ACCEPT_ENCODING
+		return session
+
+	def session_for(self, url: str, retry: Optional[bool] = None) -> requests.Session:
+		parts = urlsplit(url)
+		key = (f"{parts.scheme}://{parts.netloc}", retry)
+		session = self._sessions.get(key)
+		if session is None:
+			with self._lock:
+				session = self._sessions.get(key)
+				if session is None:
+					session = self._new_session(retry)
+					self._sessions[key] = session
+		return session
+
+	def request(self, method: str, url: str, retry: Optional[bool] = None, **kwargs) -> requests.Response:
+		return self.session_for(url, retry).request(method, url, **kwargs)
+
+	def close(self) -> None:
+		with self._lock:
+			for session in self._sessions.values():
+				session.close()
+			self._sessions.clear()
+
+
+sessions = SessionManager(
+	pool_size=int(os.environ.get("HTTP_POOL_SIZE", 32)),
+	retries=int(os.environ.get("HTTP_RETRIES", 2)),
+	backoff=float(os.environ.get("HTTP_BACKOFF", 0.2)),
+)
+
+
+def get(url: str, retry: Optional[bool] = None, **kwargs) -> requests.Response:
+	return sessions.request("GET", url, retry=retry, **kwargs)
+
+
+def post(url: str, retry: Optional[bool] = None, **kwargs) -> requests.Response:
+	return sessions.request("POST", url, retry=retry, **kwargs)
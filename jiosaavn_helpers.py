@@ -1,97 +1,290 @@
 import base64
+import binascii
 import re
-from typing import List, Dict, Any, Optional
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import List, Dict, Any, Iterable, Optional, Tuple
 from Crypto.Cipher import DES
 
 
+DEFAULT_IMAGE_QUALITIES = ('50x50', '150x150', '500x500')
+
+_IMAGE_QUALITY_RE = re.compile(r'150x150|50x50')
+_IMAGE_PROTOCOL_RE = re.compile(r'^http://')
+_IMAGE_QUALITY_PARAM_RE = re.compile(r'^\d{2,4}x\d{2,4}$')
+
+# Media URLs are DES-ECB encrypted with a fixed key; ECB keeps no per-call state, so one cipher serves all threads
+_MEDIA_CIPHER = DES.new(b'38346591', DES.MODE_ECB)
+_MEDIA_BITRATE_RE = re.compile(r'_96(?=[_.])')
+DOWNLOAD_BITRATES = ('96', '160', '320')
+
+_DECRYPTED_MAX = 8192
+_decrypted: "OrderedDict[str, Optional[str]]" = OrderedDict()
+_decrypted_lock = threading.Lock()
+
+
+def _memo_get(encrypted_media_url: str) -> Tuple[bool, Optional[str]]:
+    with _decrypted_lock:
+        if encrypted_media_url in _decrypted:
+            _decrypted.move_to_end(encrypted_media_url)
+            return True, _decrypted[encrypted_media_url]
+    return False, None
+
+
+def _memo_put(encrypted_media_url: str, link: Optional[str]) -> None:
+    with _decrypted_lock:
+        _decrypted[encrypted_media_url] = link
+        _decrypted.move_to_end(encrypted_media_url)
+        while len(_decrypted) > _DECRYPTED_MAX:
+            _decrypted.popitem(last=False)
+
+
+def _finish_link(plain: bytes) -> str:
+    # Strip PKCS#5 padding when present
+    pad = plain[-1] if plain else 0
+    if 0 < pad <= 8 and plain.endswith(bytes([pad]) * pad):
+        plain = plain[:-pad]
+    # Ensure https
+    return plain.decode('utf-8', errors='ignore').replace('http:', 'https:')
+
+
+def decrypt_media_urls(encrypted_media_urls: Iterable[Optional[str]]) -> List[Optional[str]]:
+    """Decrypt a page of media URLs; unseen ciphertexts are decrypted together in one cipher call"""
+    values = list(encrypted_media_urls)
+    links: List[Optional[str]] = [None] * len(values)
+    pending: Dict[str, bytes] = {}
+    for index, value in enumerate(values):
+        if not value:
+            continue
+        found, link = _memo_get(value)
+        if found:
+            links[index] = link
+        elif value not in pending:
+            try:
+                raw = base64.b64decode(value)
+                if not raw or len(raw) % 8:
+                    raise ValueError(f"ciphertext length {len(raw)} is not a multiple of 8")
+                pending[value] = raw
+            except (binascii.Error, ValueError) as e:
+                print(f"Error decrypting download link: {e}")
+                _memo_put(value, None)
+
+    if pending:
+        plain = _MEDIA_CIPHER.decrypt(b''.join(pending.values()))
+        offset = 0
+        for value, raw in pending.items():
+            _memo_put(value, _finish_link(plain[offset:offset + len(raw)]))
+            offset += len(raw)
+        for index, value in enumerate(values):
+            if value in pending:
+                links[index] = _memo_get(value)[1]
+    return links
+
+
 def create_download_links(encrypted_media_url: str) -> Optional[str]:
     """Create download links from encrypted media URL"""
     if not encrypted_media_url:
         return None
-    
-    try:
-        key = '38346591'
-        iv = '00000000'
-        
-        # Decode base64
-        encrypted = base64.b64decode(encrypted_media_url)
-        
-        # Create DES cipher
-        cipher = DES.new(key.encode(), DES.MODE_ECB)
-        
-        # Decrypt
-        decrypted_link = cipher.decrypt(encrypted).decode('utf-8', errors='ignore')
-        
-        # Ensure https
-        return decrypted_link.replace('http:', 'https:')
-    except Exception as e:
-        print(f"Error decrypting download link: {e}")
-        return None
+    return decrypt_media_urls([encrypted_media_url])[0]
+
+
+def create_download_variants(download_url: Optional[str]) -> List[Dict[str, str]]:
+    """Derive the 96/160/320 kbps URLs from a decrypted (96 kbps) media URL"""
+    if not download_url or not _MEDIA_BITRATE_RE.search(download_url):
+        return []
+    return [
+        {'quality': f'{bitrate}kbps', 'url': _MEDIA_BITRATE_RE.sub(f'_{bitrate}', download_url, count=1)}
+        for bitrate in DOWNLOAD_BITRATES
+    ]
+
+
+def parse_image_qualities(raw: Optional[str]) -> Tuple[str, ...]:
+    """Parse a comma-separated quality list (e.g. ``150x150,1000x1000``); raises ValueError if invalid"""
+    if not raw:
+        return DEFAULT_IMAGE_QUALITIES
+    qualities = tuple(dict.fromkeys(q.strip() for q in raw.split(',') if q.strip()))
+    if not qualities or not all(_IMAGE_QUALITY_PARAM_RE.match(q) for q in qualities):
+        raise ValueError("image_qualities must be a comma-separated list like '150x150,500x500'")
+    return qualities
 
 
-def create_image_links(link: str) -> List[Dict[str, str]]:
+@lru_cache(maxsize=8192)
+def _image_links(link: str, qualities: Tuple[str, ...]) -> Tuple[Tuple[str, str], ...]:
+    https_link = _IMAGE_PROTOCOL_RE.sub('https://', link)
+    return tuple((quality, _IMAGE_QUALITY_RE.sub(quality, https_link)) for quality in qualities)
+
+
+def create_image_links(link: str, qualities: Tuple[str, ...] = DEFAULT_IMAGE_QUALITIES) -> List[Dict[str, str]]:
     """Create image links with different qualities"""
     if not link:
         return []
-    
-    qualities = ['50x50', '150x150', '500x500']
-    quality_regex = re.compile(r'150x150|50x50')
-    protocol_regex = re.compile(r'^http://')
-    
-    return [
-        {
-            'quality': quality,
-            'url': protocol_regex.sub('https://', quality_regex.sub(quality, link))
+    return [{'quality': quality, 'url': url} for quality, url in _image_links(link, tuple(qualities))]
+
+
+@dataclass(frozen=True, slots=True)
+class ArtistRecord:
+    """Compact artist entry; identical raw entries share one interned instance"""
+    id: Optional[str]
+    name: Optional[str]
+    role: Optional[str]
+    image: str
+    type: Optional[str]
+    url: Optional[str]
+
+    def to_dict(self, image_qualities: Tuple[str, ...] = DEFAULT_IMAGE_QUALITIES) -> Dict[str, Any]:
+        return {
+            'id': self.id,
+            'name': self.name,
+            'role': self.role,
+            'image': create_image_links(self.image, image_qualities),
+            'type': self.type,
+            'url': self.url
         }
-        for quality in qualities
-    ]
 
 
-def create_artist_map_payload(artist: Dict[str, Any]) -> Dict[str, Any]:
-    """Create artist payload from raw artist data"""
-    return {
-        'id': artist.get('id'),
-        'name': artist.get('name'),
-        'role': artist.get('role'),
-        'image': create_image_links(artist.get('image', '')),
-        'type': artist.get('type'),
-        'url': artist.get('perma_url')
-    }
+@dataclass(slots=True)
+class SongRecord:
+    """Compact song representation; serialized to the public JSON shape by ``to_dict``"""
+    id: Optional[str]
+    name: Optional[str]
+    type: Optional[str]
+    year: Optional[str]
+    release_date: Optional[str]
+    duration: Optional[int]
+    label: Optional[str]
+    explicit_content: bool
+    play_count: Optional[int]
+    language: Optional[str]
+    has_lyrics: bool
+    lyrics_id: Optional[str]
+    url: Optional[str]
+    copyright: Optional[str]
+    album_id: Optional[str]
+    album_name: Optional[str]
+    album_url: Optional[str]
+    primary_artists: Tuple[ArtistRecord, ...]
+    featured_artists: Tuple[ArtistRecord, ...]
+    all_artists: Tuple[ArtistRecord, ...]
+    image: str
+    encrypted_media_url: Optional[str]
 
+    def to_dict(
+        self,
+        artist_memo: Optional[Dict[ArtistRecord, Dict[str, Any]]] = None,
+        image_qualities: Tuple[str, ...] = DEFAULT_IMAGE_QUALITIES
+    ) -> Dict[str, Any]:
+        """Build the public payload; ``artist_memo`` shares serialized artists across songs"""
+        memo = {} if artist_memo is None else artist_memo
 
-def create_song_payload(song: Dict[str, Any]) -> Dict[str, Any]:
-    """Create song payload from raw song data"""
+        def artists(records: Tuple[ArtistRecord, ...]) -> List[Dict[str, Any]]:
+            out = []
+            for record in records:
+                payload = memo.get(record)
+                if payload is None:
+                    payload = memo[record] = record.to_dict(image_qualities)
+                out.append(payload)
+            return out
+
+        download_url = create_download_links(self.encrypted_media_url)
+        return {
+            'id': self.id,
+            'name': self.name,
+            'type': self.type,
+            'year': self.year,
+            'releaseDate': self.release_date,
+            'duration': self.duration,
+            'label': self.label,
+            'explicitContent': self.explicit_content,
+            'playCount': self.play_count,
+            'language': self.language,
+            'hasLyrics': self.has_lyrics,
+            'lyricsId': self.lyrics_id,
+            'url': self.url,
+            'copyright': self.copyright,
+            'album': {
+                'id': self.album_id,
+                'name': self.album_name,
+                'url': self.album_url
+            },
+            'artists': {
+                'primary': artists(self.primary_artists),
+                'featured': artists(self.featured_artists),
+                'all': artists(self.all_artists)
+            },
+            'image': create_image_links(self.image, image_qualities),
+            'downloadUrl': download_url,
+            'downloadUrls': create_download_variants(download_url)
+        }
+
+
+def _intern_artists(raw_artists: List[Dict[str, Any]], interned: Dict[tuple, ArtistRecord]) -> Tuple[ArtistRecord, ...]:
+    records = []
+    for artist in raw_artists or []:
+        key = (
+            artist.get('id'),
+            artist.get('name'),
+            artist.get('role'),
+            artist.get('image') or '',
+            artist.get('type'),
+            artist.get('perma_url')
+        )
+        record = interned.get(key)
+        if record is None:
+            record = interned[key] = ArtistRecord(*key)
+        records.append(record)
+    return tuple(records)
+
+
+def parse_song(song: Dict[str, Any], interned: Optional[Dict[tuple, ArtistRecord]] = None) -> SongRecord:
+    """Parse raw song data; artists are interned in ``interned`` (shared across a result page)"""
+    interned = {} if interned is None else interned
     more_info = song.get('more_info', {})
     artist_map = more_info.get('artistMap', {})
-    
-    return {
-        'id': song.get('id'),
-        'name': song.get('title'),
-        'type': song.get('type'),
-        'year': song.get('year'),
-        'releaseDate': more_info.get('release_date'),
-        'duration': int(more_info.get('duration', 0)) if more_info.get('duration') else None,
-        'label': more_info.get('label'),
-        'explicitContent': song.get('explicit_content') == '1',
-        'playCount': int(song.get('play_count', 0)) if song.get('play_count') else None,
-        'language': song.get('language'),
-        'hasLyrics': more_info.get('has_lyrics') == 'true',
-        'lyricsId': more_info.get('lyrics_id'),
-        'url': song.get('perma_url'),
-        'copyright': more_info.get('copyright_text'),
-        'album': {
-            'id': more_info.get('album_id'),
-            'name': more_info.get('album'),
-            'url': more_info.get('album_url')
-        },
-        'artists': {
-            'primary': [create_artist_map_payload(artist) for artist in artist_map.get('primary_artists', [])],
-            'featured': [create_artist_map_payload(artist) for artist in artist_map.get('featured_artists', [])],
-            'all': [create_artist_map_payload(artist) for artist in artist_map.get('artists', [])]
-        },
-        'image': create_image_links(song.get('image', '')),
-        'downloadUrl': create_download_links(more_info.get('encrypted_media_url'))
-    }
+
+    return SongRecord(
+        id=song.get('id'),
+        name=song.get('title'),
+        type=song.get('type'),
+        year=song.get('year'),
+        release_date=more_info.get('release_date'),
+        duration=int(more_info.get('duration', 0)) if more_info.get('duration') else None,
+        label=more_info.get('label'),
+        explicit_content=song.get('explicit_content') == '1',
+        play_count=int(song.get('play_count', 0)) if song.get('play_count') else None,
+        language=song.get('language'),
+        has_lyrics=more_info.get('has_lyrics') == 'true',
+        lyrics_id=more_info.get('lyrics_id'),
+        url=song.get('perma_url'),
+        copyright=more_info.get('copyright_text'),
+        album_id=more_info.get('album_id'),
+        album_name=more_info.get('album'),
+        album_url=more_info.get('album_url'),
+        primary_artists=_intern_artists(artist_map.get('primary_artists', []), interned),
+        featured_artists=_intern_artists(artist_map.get('featured_artists', []), interned),
+        all_artists=_intern_artists(artist_map.get('artists', []), interned),
+        image=song.get('image') or '',
+        encrypted_media_url=more_info.get('encrypted_media_url')
+    )
+
+
+def create_song_payload(song: Dict[str, Any]) -> Dict[str, Any]:
+    """Create song payload from raw song data"""
+    return parse_song(song).to_dict()
+
+
+def create_song_payloads(
+    songs: List[Dict[str, Any]],
+    image_qualities: Tuple[str, ...] = DEFAULT_IMAGE_QUALITIES
+) -> List[Dict[str, Any]]:
+    """Create payloads for a result page, building each distinct artist only once"""
+    interned: Dict[tuple, ArtistRecord] = {}
+    artist_memo: Dict[ArtistRecord, Dict[str, Any]] = {}
+    records = [parse_song(song, interned) for song in songs]
+    # Decrypt the whole page in one pass; to_dict() then reads the memoized links
+    decrypt_media_urls(record.encrypted_media_url for record in records)
+    return [record.to_dict(artist_memo, image_qualities) for record in records]
 
 
 def normalize_string(text: str) -> str:
@@ -0,0 +1,218 @@
+import html
+import os
+import re
+from difflib import SequenceMatcher
+from functools import lru_cache
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+from jiosaavn_helpers import normalize_string
+
+
+# Minimum confidence (0..1) for a candidate to be returned
+MIN_CONFIDENCE = float(os.environ.get("JIOSAAVN_MIN_CONFIDENCE", 0.7))
+
+# Minimum title similarity on its own; a matching artist can't make up for a different song
+MIN_TITLE_SIMILARITY = float(os.environ.get("JIOSAAVN_MIN_TITLE_SIMILARITY", 0.8))
+
+# Weights of the title, artist and duration scores (duration only counts when requested)
+TITLE_WEIGHT = 0.55
+ARTIST_WEIGHT = 0.35
+DURATION_WEIGHT = 0.10
+
+# Tokens closer than this (SequenceMatcher ratio) count as the same word, e.g. transliterations
+TOKEN_SIMILARITY = 0.75
+
+# Confidence multiplier when the candidate is a different version (remix, live, ...) than requested
+VERSION_PENALTY = 0.75
+
+# Bracketed and dashed title suffixes ("(Taylor's Version)", "[Radio Edit]", " - Remastered 2011");
+# the core title before them is what has to match
+_TITLE_SUFFIX_RE = re.compile(r'[\(\[][^\)\]]*(?:[\)\]]|$)|\s-\s.*$')
+# Words marking a different recording of the same song
+_VERSION_WORDS = frozenset({
+    'remix', 'mix', 'live', 'acoustic', 'unplugged', 'instrumental', 'karaoke', 'cover',
+    'reprise', 'slowed', 'reverb', 'sped', 'lofi', 'mashup', 'bootleg', 'rework',
+})
+# Mixes that are the recording itself
+_SAME_VERSION_RE = re.compile(r'\b(?:album|original|single|radio|clean|explicit|extended)\s+mix\b')
+# Spelling variants of Hindi/Urdu transliterations ("hee"/"hi", "hoon"/"hun")
+_TRANSLITERATION = ((re.compile(r'ee|ii'), 'i'), (re.compile(r'oo|uu'), 'u'), (re.compile(r'aa'), 'a'))
+_FEATURING_RE = re.compile(r'[\(\[]?\b(?:feat\.?|ft\.?|featuring)\s+([^\)\]]+)[\)\]]?')
+_ARTIST_SPLIT_RE = re.compile(r'\s*(?:,|&|\band\b|\bfeat\.?|\bft\.?|\bfeaturing\b|\bwith\b)\s*')
+# "A x B" collaborations; only applied to candidate credits, since "X" or "Malcolm X" is a name on its own
+_COLLAB_X_RE = re.compile(r'\s+x\s+')
+_TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+
+@lru_cache(maxsize=16384)
+def normalize(text: str) -> str:
+    """Diacritic-free, lower-cased, stripped form used for matching"""
+    return normalize_string(html.unescape(text or "")).strip().lower()
+
+
+def _fold(token: str) -> str:
+    for pattern, replacement in _TRANSLITERATION:
+        token = pattern.sub(replacement, token)
+    return token
+
+
+@lru_cache(maxsize=16384)
+def title_tokens(text: str) -> FrozenSet[str]:
+    """Transliteration-folded word tokens of a title without its bracketed or dashed suffixes"""
+    core = _TITLE_SUFFIX_RE.sub(' ', normalize(text))
+    tokens = _TOKEN_RE.findall(core) or _TOKEN_RE.findall(normalize(text))
+    return frozenset(_fold(token) for token in tokens)
+
+
+@lru_cache(maxsize=16384)
+def version_tags(text: str) -> FrozenSet[str]:
+    """Words of a title marking a remix, live or other different version"""
+    return frozenset(_TOKEN_RE.findall(_SAME_VERSION_RE.sub(' ', normalize(text)))) & _VERSION_WORDS
+
+
+@lru_cache(maxsize=16384)
+def name_tokens(text: str) -> FrozenSet[str]:
+    return frozenset(_TOKEN_RE.findall(normalize(text)))
+
+
+@lru_cache(maxsize=4096)
+def split_artists(text: str, collab_x: bool = False) -> Tuple[str, ...]:
+    """Individual artist names in a credit like "A, B & C feat. D" ("A x B" too with ``collab_x``)"""
+    names = _ARTIST_SPLIT_RE.split(normalize(text))
+    if collab_x:
+        names = [part for name in names for part in _COLLAB_X_RE.split(name)]
+    return tuple(name for name in names if name)
+
+
+def _token_similarity(a: str, b: str) -> float:
+    if a == b:
+        return 1.0
+    ratio = SequenceMatcher(None, a, b).ratio()
+    return ratio if ratio >= TOKEN_SIMILARITY else 0.0
+
+
+def _coverage(tokens: FrozenSet[str], other: FrozenSet[str]) -> float:
+    """Average best fuzzy match of each token in ``tokens`` against ``other``"""
+    if not tokens or not other:
+        return 0.0
+    total = 0.0
+    for token in tokens:
+        if token in other:
+            total += 1.0
+        else:
+            total += max(_token_similarity(token, candidate) for candidate in other)
+    return total / len(tokens)
+
+
+def token_set_similarity(query: FrozenSet[str], candidate: FrozenSet[str]) -> float:
+    """Fuzzy token-set similarity weighted towards covering the query"""
+    return 0.7 * _coverage(query, candidate) + 0.3 * _coverage(candidate, query)
+
+
+def raw_artist_names(song: Dict[str, Any]) -> List[str]:
+    """Primary, featured and singer credits, read straight from the raw search result"""
+    artist_map = (song.get('more_info') or {}).get('artistMap') or {}
+    names = [(a.get('name') or '').strip() for a in artist_map.get('primary_artists') or []]
+    names += [(a.get('name') or '').strip() for a in artist_map.get('featured_artists') or []]
+    names += [(a.get('name') or '').strip() for a in artist_map.get('artists') or [] if a.get('role') == 'singer']
+    return list(dict.fromkeys(name for name in names if name))
+
+
+def _raw_duration(song: Dict[str, Any]) -> Optional[int]:
+    value = (song.get('more_info') or {}).get('duration')
+    try:
+        return int(value) if value else None
+    except (TypeError, ValueError):
+        return None
+
+
+class TrackQuery:
+    """Normalized title/artist tokens of the track being looked up, computed once per request"""
+    __slots__ = ('title', 'versions', 'artists', 'featured', 'duration')
+
+    def __init__(self, title: str, artist: str, duration: Optional[int] = None):
+        self.title = title_tokens(title)
+        self.versions = version_tags(title)
+        # Names without word tokens can't be compared, so they don't count
+        self.artists = [tokens for tokens in map(name_tokens, split_artists(artist)) if tokens]
+        # "Song (feat. X)" in the requested title credits X as well
+        featured = _FEATURING_RE.search(normalize(title))
+        self.featured = [tokens for tokens in map(name_tokens, split_artists(featured.group(1))) if tokens] if featured else []
+        self.duration = duration
+
+    def title_score(self, song: Dict[str, Any]) -> float:
+        return token_set_similarity(self.title, title_tokens(song.get('title') or ''))
+
+    def artist_score(self, names: List[str]) -> Optional[float]:
+        """Share of requested artists credited on the candidate; None when it credits nobody"""
+        if not self.artists:
+            return None
+        candidates = [tokens for name in names for tokens in map(name_tokens, split_artists(name, collab_x=True)) if tokens]
+        if not candidates:
+            return None
+
+        def best(tokens: FrozenSet[str]) -> float:
+            return max(token_set_similarity(tokens, candidate) for candidate in candidates)
+
+        main = [best(tokens) for tokens in self.artists]
+        score = sum(main) / len(main)
+        if self.featured:
+            # Matching featured artists can only help
+            credited = main + [best(tokens) for tokens in self.featured]
+            score = max(score, sum(credited) / len(credited))
+        return score
+
+    def duration_score(self, song: Dict[str, Any]) -> Optional[float]:
+        """1.0 within 3 s, falling linearly to 0 at 30 s; None when either duration is unknown"""
+        duration = _raw_duration(song)
+        if self.duration is None or duration is None:
+            return None
+        delta = abs(duration - self.duration)
+        if delta <= 3:
+            return 1.0
+        return max(0.0, 1.0 - (delta - 3) / 27)
+
+    def score(self, song: Dict[str, Any]) -> Tuple[float, Dict[str, Optional[float]]]:
+        """Weighted confidence for ``song`` and the component scores behind it.
+
+        Candidates whose core title is less than ``MIN_TITLE_SIMILARITY`` alike
+        score 0; a different version (remix, live, ...) than requested is
+        scaled by ``VERSION_PENALTY``.
+        """
+        parts = {
+            'title': self.title_score(song),
+            'artist': self.artist_score(raw_artist_names(song)),
+            'duration': self.duration_score(song)
+        }
+        if parts['title'] < MIN_TITLE_SIMILARITY:
+            return 0.0, parts
+        weighted = [(parts['title'], TITLE_WEIGHT), (parts['artist'], ARTIST_WEIGHT), (parts['duration'], DURATION_WEIGHT)]
+        total_weight = sum(weight for value, weight in weighted if value is not None)
+        confidence = sum(value * weight for value, weight in weighted if value is not None) / total_weight
+        if version_tags(song.get('title') or '') != self.versions:
+            confidence *= VERSION_PENALTY
+        return confidence, parts
+
+
+def best_match(
+    results: List[Dict[str, Any]],
+    query: TrackQuery,
+    debug: bool = False,
+    min_confidence: float = MIN_CONFIDENCE
+) -> Tuple[Optional[Dict[str, Any]], float]:
+    """Return ``(raw_song, confidence)`` for the highest scoring raw result, without building payloads.
+
+    Ties keep upstream ranking; a near-perfect candidate ends the scan early.
+    Returns ``(None, best_confidence)`` when nothing reaches ``min_confidence``.
+    """
+    best, best_confidence = None, 0.0
+    for song in results:
+        confidence, parts = query.score(song)
+        if debug:
+            print(f"[JioSaavn][match_check] track='{song.get('title')}' artists={raw_artist_names(song)} confidence={confidence:.3f} parts={parts}")
+        if confidence > best_confidence:
+            best, best_confidence = song, confidence
+            if confidence >= 0.99:
+                break
+    if best_confidence < min_confidence:
+        return None, best_confidence
+    return best, best_confidence
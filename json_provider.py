@@ -0,0 +1,77 @@
+"""Flask JSON provider backed by orjson when it is installed.
+
+Responses are compact by default (``JSON_COMPACT=0`` restores Flask's
+pretty-printing in debug mode) and keys keep their upstream order. Values
+wrapped in ``RawJSON`` are already serialized and are sent without being
+re-encoded, which is how cached payloads are served.
+"""
+from flask.json.provider import DefaultJSONProvider
+from typing import Any
+import os
+
+try:
+	import orjson
+except ImportError:  # pragma: no cover - optional speedup
+	orjson = None
+
+
+class RawJSON(bytes):
+	"""UTF-8 JSON bytes that ``FastJSONProvider.response`` passes through as-is."""
+
+
+class FastJSONProvider(DefaultJSONProvider):
+	"""``DefaultJSONProvider`` with orjson encoding/decoding and pre-serialized passthrough."""
+
+	sort_keys = False
+	ensure_ascii = False
+	compact = os.environ.get("JSON_COMPACT", "1") != "0" or None
+
+	def _orjson_options(self, indent: bool = False) -> int:
+		# Datetimes go through Flask's default() so they keep the HTTP date format
+		option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+		if self.sort_keys:
+			option |= orjson.OPT_SORT_KEYS
+		if indent:
+			option |= orjson.OPT_INDENT_2
+		return option
+
+	def dumps_bytes(self, obj: Any, indent: bool = False) -> bytes:
+		"""Serialize ``obj`` to UTF-8 JSON bytes."""
+		if orjson is not None:
+			try:
+				return orjson.dumps(obj, default=self.default, option=self._orjson_options(indent))
+			except orjson.JSONEncodeError:
+				# e.g. integers beyond 64 bits; the stdlib encoder handles them
+				pass
+		if indent:
+			return super().dumps(obj, indent=2).encode("utf-8")
+		return super().dumps(obj, separators=(",", ":")).encode("utf-8")
+
+	def raw(self, obj: Any) -> RawJSON:
+		"""Serialize ``obj`` once for later passthrough responses."""
+		return RawJSON(self.dumps_bytes(obj))
+
+	def dumps(self, obj: Any, **kwargs: Any) -> str:
+		if orjson is None or kwargs:
+			return super().dumps(obj, **kwargs)
+		return self.dumps_bytes(obj).decode("utf-8")
+
+	def loads(self, s, **kwargs: Any) -> Any:
+		if orjson is None or kwargs:
+			return super().loads(s, **kwargs)
+		return orjson.loads(s)
+
+	def response(self, *args: Any, **kwargs: Any):
+		obj = self._prepare_response_obj(args, kwargs)
+		if isinstance(obj, RawJSON):
+			body = obj
+		else:
+			indent = (self.compact is None and self._app.debug) or self.compact is False
+			body = self.dumps_bytes(obj, indent=indent)
+		return self._app.response_class(body, mimetype=self.mimetype)
+
+
+def init_json(app) -> None:
+	"""Install ``FastJSONProvider`` as ``app.json``."""
+	app.json_provider_class = FastJSONProvider
+	app.json = FastJSONProvider(app)
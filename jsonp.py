@@ -0,0 +1,65 @@
+"""Parsing of JSON/JSONP upstream responses straight from their raw bytes.
+
+Handles bare JSON, any ``callback(...)`` / ``callback(...);`` wrapper
+(``window.google.ac.h``, ``google.sbox.p50``, ...), a leading UTF-8 BOM and
+the ``)]}'`` XSSI guard. Uses orjson when it is installed and the stdlib ``json`` otherwise.
+"""
+from typing import Any, List, Union
+import json
+import re
+
+try:
+	import orjson
+except ImportError:  # pragma: no cover - optional speedup
+	orjson = None
+
+
+class JSONPError(ValueError):
+	"""Raised when a payload is not JSON, JSONP or the expected shape."""
+
+
+_BOM = b"\xef\xbb\xbf"
+_XSSI_PREFIX = b")]}'"
+_CALLBACK_RE = re.compile(rb"\s*[A-Za-z_$][\w$.]*\s*\(")
+_TRAILER_RE = re.compile(rb"\)\s*;?\s*$")
+
+if orjson is not None:
+	_decode = orjson.loads
+	_DecodeError = orjson.JSONDecodeError
+else:
+	_decode = json.loads
+	_DecodeError = json.JSONDecodeError
+
+
+def unwrap(payload: Union[bytes, str]) -> bytes:
+	"""The JSON document inside ``payload``, without callback wrapper or XSSI guard."""
+	if isinstance(payload, str):
+		payload = payload.encode("utf-8")
+	if payload.startswith(_BOM):
+		payload = payload[len(_BOM):]
+	if payload.startswith(_XSSI_PREFIX):
+		payload = payload[len(_XSSI_PREFIX):]
+	head = _CALLBACK_RE.match(payload)
+	if head is None:
+		return payload
+	tail = _TRAILER_RE.search(payload, head.end())
+	if tail is None:
+		raise JSONPError("Unterminated JSONP callback")
+	return payload[head.end():tail.start()]
+
+
+def loads(payload: Union[bytes, str]) -> Any:
+	"""Decode a JSON or JSONP ``payload``."""
+	try:
+		return _decode(unwrap(payload))
+	except _DecodeError as e:
+		raise JSONPError(f"Invalid JSON payload: {e}") from e
+
+
+def parse_suggestions(payload: Union[bytes, str]) -> List[str]:
+	"""Suggestion texts from a ``[query, [[suggestion, ...] | suggestion, ...], ...]`` payload."""
+	data = loads(payload)
+	if not isinstance(data, list) or len(data) < 2 or not isinstance(data[1], list):
+		raise JSONPError("Unexpected suggestions payload")
+	# First element of each item is the suggestion text
+	return [item if isinstance(item, str) else item[0] for item in data[1] if isinstance(item, str) or (isinstance(item, list) and item)]
@@ -0,0 +1,47 @@
+"""Server-side ``fields=`` projection of JSON payloads.
+
+``fields`` is a comma-separated list of dot paths, e.g.
+``videoDetails.title,videoDetails.thumbnail``. Lists are projected element
+by element, so ``tracks.title`` keeps only the title of every album track.
+Paths that don't exist in the payload are ignored.
+"""
+from typing import Any, Dict, Optional
+
+
+FieldTree = Dict[str, "FieldTree"]
+
+
+def parse_fields(raw: Optional[str]) -> Optional[FieldTree]:
+	"""Tree of the requested paths (an empty subtree selects everything below), or None for no projection."""
+	if not raw:
+		return None
+	tree: FieldTree = {}
+	for path in raw.split(","):
+		parts = [part.strip() for part in path.split(".") if part.strip()]
+		if not parts:
+			continue
+		node = tree
+		for index, part in enumerate(parts):
+			if part in node and not node[part]:
+				# An ancestor is already selected whole
+				break
+			node = node.setdefault(part, {})
+			if index == len(parts) - 1:
+				node.clear()
+	return tree or None
+
+
+def fields_key(tree: FieldTree) -> str:
+	"""Canonical string form of ``tree``, equal for equivalent ``fields`` values."""
+	return ",".join(f"{name}({fields_key(sub)})" if sub else name for name, sub in sorted(tree.items()))
+
+
+def project(value: Any, tree: Optional[FieldTree]) -> Any:
+	"""Copy of ``value`` containing only the paths in ``tree``."""
+	if not tree:
+		return value
+	if isinstance(value, list):
+		return [project(item, tree) for item in value]
+	if isinstance(value, dict):
+		return {name: project(value[name], sub) for name, sub in tree.items() if name in value}
+	return value
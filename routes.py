@@ -1,7 +1,13 @@
-from flask import Blueprint, current_app, jsonify, request
+from flask import Blueprint, jsonify, request
+from cache import cached_json
+from suggestions import get_suggestion_cache
+from hedging import HedgedGroup
+from ytmusic_pool import current_locale, lease_client
+from upstreams import UpstreamUnavailable, http_failed, register_upstream
 from typing import Optional
-import requests
-import json
+import http_client
+import jsonp
+import os
 
 bp = Blueprint("api", __name__)
 
@@ -20,82 +26,105 @@ ALLOWED_FILTERS = {
 
 
 def _client():
-	return current_app.config["YTMUSIC_CLIENT"]
+	return lease_client()
 
 
-def _get_youtube_suggestions_fallback(query: str) -> list:
-	"""Fallback method using a different approach"""
+# Interchangeable suggestion endpoints, raced by _suggest_hedge in order of health
+_SUGGEST_HEADERS = {
+	"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+	"Accept": "*/*",
+	"Accept-Language": "en-US,en;q=0.9",
+	"Referer": "https://www.youtube.com/",
+	"Origin": "https://www.youtube.com",
+}
+SUGGEST_ENDPOINTS = {
+	"suggestqueries": {
+		"url": "https://suggestqueries-clients6.youtube.com/complete/search",
+		"params": {
+			"ds": "yt",
+			"hl": "en",
+			"gl": "in",
+			"client": "youtube",
+			"gs_ri": "youtube",
+			"sugexp": "yrpeb_p,ytpso.bo.rwjb=50,ytpso.bo.rlcft=0.01",
+			"tok": "cmbVoqd59wmnnS3CDslsDQ",
+			"h": "180",
+			"w": "320",
+			"ytvs": "1",
+			"gs_id": "1",
+			"cp": "1",
+		},
+	},
+	"google_complete": {
+		"url": "https://clients1.google.com/complete/search",
+		"params": {
+			"client": "youtube",
+			"hl": "en",
+			"gl": "in",
+			"callback": "google.sbox.p50",
+		},
+	},
+	"suggestqueries_basic": {
+		"url": "https://suggestqueries-clients6.youtube.com/complete/search",
+		"params": {
+			"ds": "yt",
+			"hl": "en",
+			"gl": "in",
+			"client": "youtube",
+		},
+	},
+}
+
+# One breaker per endpoint, so a degraded mirror doesn't shut out the healthy ones
+_suggest_upstreams = {name: register_upstream(f"suggest_{name}", 1000) for name in SUGGEST_ENDPOINTS}
+
+# Start the next endpoint if the current ones haven't answered within SUGGEST_HEDGE_DELAY_MS
+_suggest_hedge = HedgedGroup(
+	"suggestions",
+	delay=int(os.environ.get("SUGGEST_HEDGE_DELAY_MS", 75)) / 1000,
+	deadline=int(os.environ.get("SUGGEST_DEADLINE_MS", 1000)) / 1000,
+	workers=int(os.environ.get("SUGGEST_HEDGE_WORKERS", 32)),
+)
+
+
+def _fetch_suggest_endpoint(name: str, query: str) -> Optional[list]:
+	endpoint = SUGGEST_ENDPOINTS[name]
+	# Accept-Encoding is negotiated by the pooled session (decoded transparently).
+	# While the breaker is open this raises at once and the hedge moves on.
+	response = _suggest_upstreams[name].call(
+		lambda: http_client.get(
+			endpoint["url"],
+			params={**endpoint["params"], "q": query},
+			headers=_SUGGEST_HEADERS,
+			timeout=_suggest_hedge.deadline,
+			# The hedge is the retry; a retrying loser would hold a hedge worker for several deadlines
+			retry=False,
+		),
+		http_failed,
+	)
+	if response.status_code != 200:
+		print(f"[Suggestions] {name} returned status {response.status_code}")
+		return None
+	return jsonp.parse_suggestions(response.content)
+
+
+def _fetch_youtube_suggestions(query: str) -> Optional[list]:
+	"""Suggestions from whichever YouTube endpoint answers first, or None if all of them fail"""
+	suggestions, endpoint = _suggest_hedge.call(
+		{name: (lambda name=name: _fetch_suggest_endpoint(name, query)) for name in SUGGEST_ENDPOINTS}
+	)
+	if endpoint is not None:
+		print(f"[Suggestions] {endpoint} returned {len(suggestions)} suggestions")
+	return suggestions
+
+
+def _fetch_music_suggestions(query: str) -> Optional[list]:
+	"""Suggestions from YouTube Music, or None while its circuit breaker is open"""
 	try:
-		# Try multiple fallback endpoints
-		endpoints = [
-			{
-				"url": "https://clients1.google.com/complete/search",
-				"params": {
-					"client": "youtube",
-					"hl": "en",
-					"gl": "in",
-					"q": query,
-					"callback": "google.sbox.p50"
-				}
-			},
-			{
-				"url": "https://suggestqueries-clients6.youtube.com/complete/search",
-				"params": {
-					"ds": "yt",
-					"hl": "en",
-					"gl": "in",
-					"client": "youtube",
-					"q": query
-				}
-			}
-		]
-		
-		headers = {
-			"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-			"Accept": "*/*",
-			"Referer": "https://www.youtube.com/"
-		}
-		
-		for endpoint in endpoints:
-			try:
-				response = requests.get(endpoint["url"], params=endpoint["params"], headers=headers, timeout=10)
-				if response.status_code == 200:
-					content = response.text
-					
-					# Handle different callback formats
-					if content.startswith("google.sbox.p50(") and content.endswith(");"):
-						content = content[16:-2]
-					elif content.startswith("window.google.ac.h(") and content.endswith(");"):
-						content = content[20:-2]
-					elif content.startswith("window.google.ac.s(") and content.endswith(");"):
-						content = content[20:-2]
-					else:
-						# Try to find the start and end of the JSON
-						start_idx = content.find('(')
-						end_idx = content.rfind(')')
-						if start_idx != -1 and end_idx != -1:
-							content = content[start_idx + 1:end_idx]
-					
-					data = json.loads(content)
-					if len(data) >= 2 and isinstance(data[1], list):
-						suggestions = []
-						for item in data[1]:
-							if isinstance(item, list) and len(item) > 0:
-								suggestions.append(item[0])
-							elif isinstance(item, str):
-								suggestions.append(item)
-						
-						if suggestions:
-							print(f"Fallback API returned {len(suggestions)} suggestions")
-							return suggestions[:10]  # Limit to 10 suggestions
-			except Exception as e:
-				print(f"Fallback endpoint failed: {e}")
-				continue
-		
-		# If all APIs fail, return basic suggestions based on query
-		return _get_static_suggestions(query)
-	except:
-		return _get_static_suggestions(query)
+		return _client().get_search_suggestions(query)
+	except UpstreamUnavailable as e:
+		print(f"[Suggestions] {e}")
+		return None
 
 
 def _get_static_suggestions(query: str) -> list:
@@ -130,108 +159,11 @@ def _get_static_suggestions(query: str) -> list:
 
 
 def _get_youtube_suggestions(query: str) -> list:
-	"""Get search suggestions from YouTube's internal API"""
-	try:
-		# YouTube's internal suggestions API
-		url = "https://suggestqueries-clients6.youtube.com/complete/search"
-		params = {
-			"ds": "yt",
-			"hl": "en",
-			"gl": "in", 
-			"client": "youtube",
-			"gs_ri": "youtube",
-			"sugexp": "yrpeb_p,ytpso.bo.rwjb=50,ytpso.bo.rlcft=0.01",
-			"tok": "cmbVoqd59wmnnS3CDslsDQ",
-			"h": "180",
-			"w": "320",
-			"ytvs": "1",
-			"gs_id": "1",
-			"q": query,
-			"cp": "1"
-		}
-		
-		# Use a more generic user agent that's less likely to be blocked
-		# Remove Accept-Encoding to avoid compression issues on server
-		headers = {
-			"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-			"Accept": "*/*",
-			"Accept-Language": "en-US,en;q=0.9",
-			"Referer": "https://www.youtube.com/",
-			"Origin": "https://www.youtube.com",
-			"Cache-Control": "no-cache",
-			"Pragma": "no-cache"
-		}
-		
-		response = requests.get(url, params=params, headers=headers, timeout=15)
-		
-		# Log response details for debugging
-		print(f"YouTube API Response - Status: {response.status_code}, Length: {len(response.text)}")
-		
-		if response.status_code != 200:
-			print(f"YouTube API Error - Status: {response.status_code}, Response: {response.text[:200]}")
-			return []
-		
-		# Parse the JSONP response
-		content = response.text
-		
-		# Check if response is empty or invalid
-		if not content or len(content) < 10:
-			print(f"YouTube API returned empty/invalid response: {content}")
-			return []
-		
-		# Check if content looks like binary/compressed data
-		if any(ord(c) < 32 and c not in '\t\n\r' for c in content[:50]):
-			print(f"YouTube API returned binary/compressed data, trying fallback...")
-			return _get_youtube_suggestions_fallback(query)
-		
-		# Remove the callback wrapper (e.g., "window.google.ac.h(" and ");")
-		if content.startswith("window.google.ac.h(") and content.endswith(");"):
-			content = content[20:-2]
-		elif content.startswith("window.google.ac.s(") and content.endswith(");"):
-			content = content[20:-2]
-		else:
-			# Try to find the start and end of the JSON
-			start_idx = content.find('(')
-			end_idx = content.rfind(')')
-			if start_idx != -1 and end_idx != -1:
-				content = content[start_idx + 1:end_idx]
-			else:
-				print(f"Could not parse YouTube API response: {content[:100]}...")
-				return []
-		
-		data = json.loads(content)
-		
-		# Extract suggestions from the response
-		# The response format is: [query, [[suggestion, 0, [512]], ...], {}, {}]
-		if len(data) >= 2 and isinstance(data[1], list):
-			suggestions = []
-			for item in data[1]:
-				if isinstance(item, list) and len(item) > 0:
-					suggestions.append(item[0])  # First element is the suggestion text
-			print(f"YouTube API returned {len(suggestions)} suggestions")
-			return suggestions
-		
-		print(f"YouTube API response format unexpected: {data}")
-		# Try fallback method
-		print("Trying fallback method...")
-		return _get_youtube_suggestions_fallback(query)
-		
-	except requests.exceptions.RequestException as e:
-		print(f"Network error getting YouTube suggestions: {e}")
-		# Try fallback method
-		print("Trying fallback method...")
-		return _get_youtube_suggestions_fallback(query)
-	except json.JSONDecodeError as e:
-		print(f"JSON decode error getting YouTube suggestions: {e}")
-		# Try fallback method
-		print("Trying fallback method...")
-		return _get_youtube_suggestions_fallback(query)
-	except Exception as e:
-		# Log the error but don't fail completely
-		print(f"Unexpected error getting YouTube suggestions: {e}")
-		# Try fallback method
-		print("Trying fallback method...")
-		return _get_youtube_suggestions_fallback(query)
+	"""Get search suggestions from YouTube's internal API, or static ones if it is unreachable"""
+	suggestions = _fetch_youtube_suggestions(query)
+	if suggestions is None:
+		return _get_static_suggestions(query)
+	return suggestions
 
 
 @bp.get("/search")
@@ -273,8 +205,11 @@ def search():
 		return jsonify({"error": f"Invalid filter. Allowed: {sorted(list(ALLOWED_FILTERS))}"}), 400
 
 	try:
-		results = _client().search(query, filter=flt, limit=limit, ignore_spelling=False)
-		return jsonify({"results": results})
+		return cached_json(
+			"search",
+			{"q": query, "filter": flt, "limit": limit},
+			lambda: {"results": _client().search(query, filter=flt, limit=limit, ignore_spelling=False)},
+		)
 	except Exception as e:
 		return jsonify({"error": f"Search failed: {str(e)}"}), 500
 
@@ -319,7 +254,7 @@ def suggestions():
 	    description: If 1, get suggestions from YouTube Music. If not present or 0, get suggestions from YouTube
 	responses:
 	  200:
-	    description: Suggestions
+	    description: Suggestions (X-Cache is HIT, PREFIX when derived from a cached shorter query, or MISS)
 	  400:
 	    description: Missing/invalid params
 	"""
@@ -332,11 +267,17 @@ def suggestions():
 	try:
 		if music == 1:
 			# Get suggestions from YouTube Music
-			sugs = _client().get_search_suggestions(query)
-			return jsonify({"suggestions": sugs, "source": "youtube_music"})
+			source = "youtube_music"
+			# YouTube Music suggestions follow the hl/gl locale of the pooled client
+			sugs, state = get_suggestion_cache(source, current_locale()).get(query, _fetch_music_suggestions)
 		else:
 			# Get suggestions from YouTube
-			sugs = _get_youtube_suggestions(query)
-			return jsonify({"suggestions": sugs, "source": "youtube"})
+			source = "youtube"
+			sugs, state = get_suggestion_cache(source).get(query, _fetch_youtube_suggestions)
+		if sugs is None:
+			sugs = _get_static_suggestions(query)
+		resp = jsonify({"suggestions": sugs, "source": source})
+		resp.headers["X-Cache"] = state
+		return resp
 	except Exception as e:
 		return jsonify({"error": f"Suggestions failed: {str(e)}"}), 500
@@ -1,11 +1,42 @@
-from flask import Blueprint, current_app, jsonify, request
-import requests
+from flask import Blueprint, Response, current_app, g, jsonify, request, stream_with_context
+from cache import cached_json, cached_value
+from projection import parse_fields, project
+from ytmusic_pool import current_locale, lease_client
+from upstreams import UpstreamUnavailable, get_upstream, http_failed, unavailable_response
+from concurrent.futures import ThreadPoolExecutor
+from singleflight import coalesce, flight_key
+from ytmusicapi import YTMusic
+from ytmusicapi.continuations import get_continuation_contents, get_continuation_params
+from ytmusicapi.navigation import CONTENT, SECTION, TWO_COLUMN_RENDERER, nav
+from ytmusicapi.parsers.playlists import parse_playlist_items
+import http_client
+import os
 
 bp_entities = Blueprint("entities", __name__)
 
+# Bounded pool shared by all /batch requests
+BATCH_MAX_IDS = int(os.environ.get("BATCH_MAX_IDS", 100))
+_batch_pool = ThreadPoolExecutor(
+	max_workers=int(os.environ.get("BATCH_WORKERS", 16)),
+	thread_name_prefix="batch",
+)
+
 
 def _client():
-	return current_app.config["YTMUSIC_CLIENT"]
+	return lease_client()
+
+
+# type -> (cache endpoint, cache params, upstream call); keys match the single-item routes
+BATCH_TYPES = {
+	"songs": ("songs", lambda i, _: {"video_id": i}, lambda i, _: _client().get_song(i)),
+	"albums": ("albums", lambda i, _: {"browse_id": i}, lambda i, _: _client().get_album(i)),
+	"artists": ("artists", lambda i, _: {"browse_id": i}, lambda i, _: _client().get_artist(i)),
+	"playlists": (
+		"playlists",
+		lambda i, limit: {"playlist_id": i, "limit": limit},
+		lambda i, limit: _client().get_playlist(i, limit=limit),
+	),
+}
 
 
 @bp_entities.get("/songs/<video_id>")
@@ -17,6 +48,11 @@ def get_song(video_id: str):
 	    in: path
 	    type: string
 	    required: true
+	  - name: fields
+	    in: query
+	    type: string
+	    required: false
+	    description: Comma-separated dot paths to return, e.g. videoDetails.title,videoDetails.thumbnail
 	responses:
 	  200:
 	    description: Song metadata
@@ -24,8 +60,7 @@ def get_song(video_id: str):
 	    description: Song data unavailable
 	"""
 	try:
-		data = _client().get_song(video_id)
-		return jsonify(data)
+		return cached_json("songs", {"video_id": video_id}, lambda: _client().get_song(video_id), fields=request.args.get("fields"))
 	except Exception as e:
 		return jsonify({"error": f"Song data unavailable: {str(e)}"}), 500
 
@@ -39,6 +74,11 @@ def get_album(browse_id: str):
 	    in: path
 	    type: string
 	    required: true
+	  - name: fields
+	    in: query
+	    type: string
+	    required: false
+	    description: Comma-separated dot paths to return (lists are projected per item)
 	responses:
 	  200:
 	    description: Album metadata and tracks
@@ -46,8 +86,7 @@ def get_album(browse_id: str):
 	    description: Album data unavailable
 	"""
 	try:
-		data = _client().get_album(browse_id)
-		return jsonify(data)
+		return cached_json("albums", {"browse_id": browse_id}, lambda: _client().get_album(browse_id), fields=request.args.get("fields"))
 	except Exception as e:
 		return jsonify({"error": f"Album data unavailable: {str(e)}"}), 500
 
@@ -61,6 +100,11 @@ def get_artist(browse_id: str):
 	    in: path
 	    type: string
 	    required: true
+	  - name: fields
+	    in: query
+	    type: string
+	    required: false
+	    description: Comma-separated dot paths to return (lists are projected per item)
 	responses:
 	  200:
 	    description: Artist info and releases
@@ -68,8 +112,7 @@ def get_artist(browse_id: str):
 	    description: Artist data unavailable
 	"""
 	try:
-		data = _client().get_artist(browse_id)
-		return jsonify(data)
+		return cached_json("artists", {"browse_id": browse_id}, lambda: _client().get_artist(browse_id), fields=request.args.get("fields"))
 	except Exception as e:
 		return jsonify({"error": f"Artist data unavailable: {str(e)}"}), 500
 
@@ -88,6 +131,17 @@ def get_playlist(playlist_id: str):
 	    type: integer
 	    required: false
 	    default: 100
+	  - name: stream
+	    in: query
+	    type: string
+	    required: false
+	    enum: [ndjson]
+	    description: Stream newline-delimited JSON (a header line, one line per track as each page arrives, then an end line)
+	  - name: fields
+	    in: query
+	    type: string
+	    required: false
+	    description: Comma-separated dot paths to return (lists are projected per item)
 	responses:
 	  200:
 	    description: Playlist metadata and items
@@ -95,13 +149,168 @@ def get_playlist(playlist_id: str):
 	    description: Playlist data unavailable
 	"""
 	limit = request.args.get("limit", default=100, type=int)
+	if request.args.get("stream") == "ndjson":
+		try:
+			pages = _iter_playlist(_client(), playlist_id, limit)
+			header = next(pages)
+		except UpstreamUnavailable as e:
+			return unavailable_response(e)
+		except Exception as e:
+			return jsonify({"error": f"Playlist data unavailable: {str(e)}"}), 500
+		return Response(stream_with_context(_ndjson_playlist(header, pages)), mimetype="application/x-ndjson")
 	try:
-		data = _client().get_playlist(playlist_id, limit=limit)
-		return jsonify(data)
+		return cached_json(
+			"playlists",
+			{"playlist_id": playlist_id, "limit": limit},
+			lambda: _client().get_playlist(playlist_id, limit=limit),
+			fields=request.args.get("fields"),
+		)
 	except Exception as e:
 		return jsonify({"error": f"Playlist data unavailable: {str(e)}"}), 500
 
 
+class _FirstPageClient:
+	"""Client stand-in that answers the initial browse request from an already fetched response."""
+
+	def __init__(self, client, response: dict):
+		self._client = client
+		self._response = response
+
+	def _send_request(self, endpoint: str, body: dict, additionalParams: str = "") -> dict:
+		if not additionalParams:
+			return self._response
+		return self._client._send_request(endpoint, body, additionalParams)
+
+	def __getattr__(self, name):
+		return getattr(self._client, name)
+
+
+def _iter_playlist(client, playlist_id: str, limit: int):
+	"""Yield the playlist header, then each track as soon as its page has been fetched."""
+	body = {"browseId": playlist_id if playlist_id.startswith("VL") else "VL" + playlist_id}
+	first = client._send_request("browse", body)
+
+	# Reuse ytmusicapi's header parsing on the page we already have (limit=0: no continuations)
+	header = YTMusic.get_playlist(_FirstPageClient(client, first), playlist_id, limit=0)
+	tracks = header.pop("tracks", [])
+	header.pop("duration_seconds", None)  # only known once every page is in
+	yield header
+
+	count = 0
+	results = nav(first, [*TWO_COLUMN_RENDERER, "secondaryContents", *SECTION, *CONTENT, "musicPlaylistShelfRenderer"], True)
+	while True:
+		for track in tracks:
+			if count >= limit:
+				return
+			yield track
+			count += 1
+		if count >= limit or not results or "continuations" not in results:
+			return
+		response = client._send_request("browse", body, get_continuation_params(results))
+		results = nav(response, ["continuationContents", "musicPlaylistShelfContinuation"], True)
+		tracks = get_continuation_contents(results, parse_playlist_items) if results else []
+		if not tracks:
+			return
+
+
+def _ndjson_playlist(header: dict, tracks):
+	dumps = current_app.json.dumps
+	yield dumps({"type": "header", "data": header}) + "\n"
+	count = 0
+	try:
+		for track in tracks:
+			yield dumps({"type": "track", "data": track}) + "\n"
+			count += 1
+	except Exception as e:
+		yield dumps({"type": "error", "error": f"Playlist data unavailable: {str(e)}", "count": count}) + "\n"
+		return
+	yield dumps({"type": "end", "count": count}) + "\n"
+
+
+@bp_entities.post("/batch")
+def batch():
+	"""Resolve many songs, albums, artists and playlists in one call
+	---
+	parameters:
+	  - name: body
+	    in: body
+	    required: true
+	    schema:
+	      type: object
+	      properties:
+	        songs:
+	          type: array
+	          items:
+	            type: string
+	        albums:
+	          type: array
+	          items:
+	            type: string
+	        artists:
+	          type: array
+	          items:
+	            type: string
+	        playlists:
+	          type: array
+	          items:
+	            type: string
+	        limit:
+	          type: integer
+	          default: 100
+	          description: Track limit applied to each playlist
+	responses:
+	  200:
+	    description: Map of type -> id -> {status, data|error}
+	  400:
+	    description: Invalid body or too many ids
+	"""
+	body = request.get_json(silent=True)
+	if not isinstance(body, dict):
+		return jsonify({"error": "Expected a JSON object body"}), 400
+	unknown = [k for k in body if k not in BATCH_TYPES and k != "limit"]
+	if unknown:
+		return jsonify({"error": f"Unknown types {unknown}. Allowed: {sorted(BATCH_TYPES)}"}), 400
+	limit = body.get("limit", 100)
+	if not isinstance(limit, int):
+		return jsonify({"error": "'limit' must be an integer"}), 400
+
+	wanted = {}
+	for kind in BATCH_TYPES:
+		ids = body.get(kind) or []
+		if not isinstance(ids, list) or not all(isinstance(i, str) and i for i in ids):
+			return jsonify({"error": f"'{kind}' must be a list of ids"}), 400
+		if ids:
+			wanted[kind] = list(dict.fromkeys(ids))
+	total = sum(len(ids) for ids in wanted.values())
+	if total == 0:
+		return jsonify({"error": f"Provide at least one id under {sorted(BATCH_TYPES)}"}), 400
+	if total > BATCH_MAX_IDS:
+		return jsonify({"error": f"Too many ids ({total}); max {BATCH_MAX_IDS}"}), 400
+
+	app = current_app._get_current_object()
+	locale = current_locale()
+
+	def resolve(kind: str, item_id: str):
+		endpoint, params, load = BATCH_TYPES[kind]
+		with app.app_context():
+			g.ytmusic_locale = locale
+			return cached_value(endpoint, params(item_id, limit), lambda: load(item_id, limit))
+
+	futures = {
+		(kind, item_id): _batch_pool.submit(resolve, kind, item_id)
+		for kind, ids in wanted.items()
+		for item_id in ids
+	}
+	results = {kind: {} for kind in wanted}
+	for (kind, item_id), future in futures.items():
+		try:
+			data, hit = future.result()
+			results[kind][item_id] = {"status": "ok", "cached": hit, "data": data}
+		except Exception as e:
+			results[kind][item_id] = {"status": "error", "error": str(e)}
+	return jsonify(results)
+
+
 @bp_entities.get("/artist/<artist_id>")
 def get_artist_summary(artist_id: str):
 	"""Get artist summary via youtubei browse (Top songs, recommendations, featured-on)
@@ -116,6 +325,11 @@ def get_artist_summary(artist_id: str):
 	    type: string
 	    required: false
 	    default: US
+	  - name: fields
+	    in: query
+	    type: string
+	    required: false
+	    description: Comma-separated dot paths to return (lists are projected per item)
 	responses:
 	  200:
 	    description: Artist summary payload
@@ -135,11 +349,19 @@ def get_artist_summary(artist_id: str):
 				}
 			}
 		}
-		resp = requests.post(
-			YOUTUBE_MUSIC_API_URL,
-			headers={"Content-Type": "application/json"},
-			json=body,
-			timeout=15,
+		resp = coalesce(
+			flight_key("artist_summary", {"artist_id": artist_id, "country": country}),
+			lambda: get_upstream("ytmusic").call(
+				lambda: http_client.post(
+					YOUTUBE_MUSIC_API_URL,
+					headers={"Content-Type": "application/json"},
+					json=body,
+					timeout=15,
+					# browse is a read-only POST, safe to retry
+					retry=True,
+				),
+				http_failed,
+			),
 		)
 		if not resp.ok:
 			return jsonify({"error": f"HTTP error: {resp.status_code}"}), 500
@@ -230,11 +452,13 @@ def get_artist_summary(artist_id: str):
 						})
 					break
 
-		return jsonify({
+		return jsonify(project({
 			"artistName": artist_header,
 			"playlistId": playlist_id,
 			"recommendedArtists": recommended_artists,
 			"featuredOnPlaylists": featured_on_playlists,
-		})
+		}, parse_fields(request.args.get("fields"))))
+	except UpstreamUnavailable as e:
+		return unavailable_response(e)
 	except Exception as e:
 		return jsonify({"error": f"Artist data unavailable: {str(e)}"}), 500
@@ -1,10 +1,13 @@
-from flask import Blueprint, current_app, jsonify, request
+from flask import Blueprint, jsonify, request
+from cache import cached_json
+from projection import parse_fields, project
+from ytmusic_pool import lease_client
 
 bp_explore = Blueprint("explore", __name__)
 
 
 def _client():
-	return current_app.config["YTMUSIC_CLIENT"]
+	return lease_client()
 
 
 @bp_explore.get("/charts")
@@ -16,6 +19,11 @@ def charts():
 	    in: query
 	    type: string
 	    required: false
+	  - name: fields
+	    in: query
+	    type: string
+	    required: false
+	    description: Comma-separated dot paths to return (lists are projected per item)
 	responses:
 	  200:
 	    description: Charts data
@@ -24,8 +32,7 @@ def charts():
 	"""
 	country = request.args.get("country", default=None, type=str)
 	try:
-		data = _client().get_charts(country=country)
-		return jsonify(data)
+		return cached_json("charts", {"country": country}, lambda: _client().get_charts(country=country), fields=request.args.get("fields"))
 	except Exception as e:
 		error_msg = str(e) if str(e).strip() else "Charts service temporarily unavailable"
 		return jsonify({
@@ -39,6 +46,12 @@ def charts():
 def moods():
 	"""Get mood/genre categories
 	---
+	parameters:
+	  - name: fields
+	    in: query
+	    type: string
+	    required: false
+	    description: Comma-separated dot paths to return (lists are projected per item)
 	responses:
 	  200:
 	    description: Mood categories
@@ -46,8 +59,7 @@ def moods():
 	    description: Mood categories unavailable
 	"""
 	try:
-		data = _client().get_mood_categories()
-		return jsonify(data)
+		return cached_json("moods", {}, lambda: _client().get_mood_categories(), fields=request.args.get("fields"))
 	except Exception as e:
 		error_msg = str(e) if str(e).strip() else "Mood categories service temporarily unavailable"
 		return jsonify({
@@ -66,6 +78,11 @@ def moods_playlists(category_id: str):
 	    in: path
 	    type: string
 	    required: true
+	  - name: fields
+	    in: query
+	    type: string
+	    required: false
+	    description: Comma-separated dot paths to return (lists are projected per item)
 	responses:
 	  200:
 	    description: Mood playlists
@@ -73,8 +90,7 @@ def moods_playlists(category_id: str):
 	    description: Mood playlists unavailable
 	"""
 	try:
-		data = _client().get_mood_playlists(category_id)
-		return jsonify(data)
+		return cached_json("moods_playlists", {"category_id": category_id}, lambda: _client().get_mood_playlists(category_id), fields=request.args.get("fields"))
 	except Exception as e:
 		error_msg = str(e) if str(e).strip() else "Mood playlists service temporarily unavailable"
 		return jsonify({
@@ -112,6 +128,11 @@ def watch_playlist():
 	    type: integer
 	    required: false
 	    default: 25
+	  - name: fields
+	    in: query
+	    type: string
+	    required: false
+	    description: Comma-separated dot paths to return (lists are projected per item)
 	responses:
 	  200:
 	    description: Watch playlist data
@@ -127,6 +148,6 @@ def watch_playlist():
 		return jsonify({"error": "Provide either videoId or playlistId"}), 400
 	try:
 		data = _client().get_watch_playlist(videoId=video_id, playlistId=playlist_id, radio=radio, shuffle=shuffle, limit=limit)
-		return jsonify(data)
+		return jsonify(project(data, parse_fields(request.args.get("fields"))))
 	except Exception as e:
 		return jsonify({"error": f"Watch playlist unavailable: {str(e)}"}), 500
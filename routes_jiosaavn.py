@@ -1,44 +1,114 @@
 from flask import Blueprint, jsonify, request
+from concurrent.futures import ThreadPoolExecutor
+import http_client
+import os
 import requests
+import threading
 import time
-from jiosaavn_helpers import create_song_payload, normalize_string
-from typing import Dict, Any, List
+from cache import CacheEntry, SQLiteBackend, data_dir
+from jiosaavn_helpers import DEFAULT_IMAGE_QUALITIES, create_song_payloads, parse_image_qualities, parse_song
+from jiosaavn_match import TrackQuery, best_match, normalize, raw_artist_names
+from singleflight import coalesce
+from upstreams import UpstreamUnavailable, get_upstream, http_failed, unavailable_response
+from typing import Dict, Any, List, Optional, Tuple
 
 bp_jiosaavn = Blueprint("jiosaavn", __name__)
 
+# Persistent (title, artist[, videoId][, duration]) -> resolved track store. Matches
+# with at least JIOSAAVN_RESOLVE_MIN_CONFIDENCE are served as fresh for
+# JIOSAAVN_RESOLVE_TTL seconds (decrypted URLs go stale), then served stale while
+# refreshed in the background, and dropped after JIOSAAVN_RESOLVE_MAX_AGE. Weaker
+# matches are only kept for JIOSAAVN_RESOLVE_LOW_TTL seconds, without stale serving.
+# Stored in data_dir() unless JIOSAAVN_RESOLVE_DB is set; an empty string disables it.
+RESOLVE_TTL = int(os.environ.get("JIOSAAVN_RESOLVE_TTL", 6 * 3600))
+RESOLVE_MAX_AGE = int(os.environ.get("JIOSAAVN_RESOLVE_MAX_AGE", 7 * 24 * 3600))
+RESOLVE_MIN_CONFIDENCE = float(os.environ.get("JIOSAAVN_RESOLVE_MIN_CONFIDENCE", 0.9))
+RESOLVE_LOW_TTL = int(os.environ.get("JIOSAAVN_RESOLVE_LOW_TTL", 15 * 60))
+_resolve_db = os.environ.get("JIOSAAVN_RESOLVE_DB")
+if _resolve_db is None:
+    _resolve_db = os.path.join(data_dir(), "ytm-jiosaavn.sqlite3")
+_resolutions = SQLiteBackend(_resolve_db) if _resolve_db else None
 
-@bp_jiosaavn.get("/jiosaavn/search")
-def jiosaavn_search():
-    """Search for music on JioSaavn
-    ---
-    parameters:
-      - name: title
-        in: query
-        type: string
-        required: true
-        description: Song title
-      - name: artist
-        in: query
-        type: string
-        required: true
-        description: Artist name
-    responses:
-      200:
-        description: Song information with download URL
-      400:
-        description: Missing title or artist parameters
-      404:
-        description: Music stream not found
-      500:
-        description: Internal server error
+_refresh_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="jiosaavn-refresh")
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+
+
+def _resolution_key(title: str, artist: str, video_id: Optional[str], duration: Optional[int], image_qualities: Tuple[str, ...]) -> str:
+    suffix = "" if image_qualities == DEFAULT_IMAGE_QUALITIES else "|" + ",".join(image_qualities)
+    # The duration hint changes which candidate wins
+    if duration is not None:
+        suffix = f"|d{duration}{suffix}"
+    if video_id:
+        return f"jiosaavn:v:{video_id}{suffix}"
+    return f"jiosaavn:q:{normalize(title)}|{normalize(artist)}{suffix}"
+
+
+def _lookup_resolution(title: str, artist: str, video_id: Optional[str], duration: Optional[int], image_qualities: Tuple[str, ...]) -> Tuple[str, Optional[CacheEntry]]:
+    """Find a stored resolution by videoId first, then by normalized title/artist"""
+    keys = [_resolution_key(title, artist, None, duration, image_qualities)]
+    if video_id:
+        keys.insert(0, _resolution_key(title, artist, video_id, duration, image_qualities))
+    for key in keys:
+        try:
+            entry = _resolutions.get(key)
+        except Exception as e:
+            print(f"[JioSaavn][ERR] Resolution lookup failed: {e}")
+            return keys[0], None
+        if entry is not None:
+            return key, entry
+    return keys[0], None
+
+
+def _store_resolution(title: str, artist: str, video_id: Optional[str], duration: Optional[int], image_qualities: Tuple[str, ...], body: Dict[str, Any]) -> None:
+    if _resolutions is None:
+        return
+    if body.get("confidence", 0) >= RESOLVE_MIN_CONFIDENCE:
+        ttl, max_age = RESOLVE_TTL, RESOLVE_MAX_AGE
+    else:
+        # Possibly the wrong song; don't let it outlive a short TTL
+        ttl = max_age = RESOLVE_LOW_TTL
+    entry = CacheEntry(body, ttl)
+    try:
+        _resolutions.set(_resolution_key(title, artist, None, duration, image_qualities), entry, max_age)
+        if video_id:
+            _resolutions.set(_resolution_key(title, artist, video_id, duration, image_qualities), entry, max_age)
+    except Exception as e:
+        print(f"[JioSaavn][ERR] Failed to store resolution: {e}")
+
+
+def _schedule_refresh(key: str, title: str, artist: str, duration: Optional[int], image_qualities: Tuple[str, ...], video_id: Optional[str]) -> None:
+    """Re-resolve a stale entry in the background (at most once at a time per key)"""
+    with _refreshing_lock:
+        if key in _refreshing:
+            return
+        _refreshing.add(key)
+
+    def refresh():
+        try:
+            body, status = _resolve_track(title, artist, duration, image_qualities)
+            if status == 200:
+                _store_resolution(title, artist, video_id, duration, image_qualities, body)
+        except UpstreamUnavailable as e:
+            print(f"[JioSaavn] refresh skipped, still serving stale: {e}")
+        finally:
+            with _refreshing_lock:
+                _refreshing.discard(key)
+
+    _refresh_pool.submit(refresh)
+
+
+def _resolve_track(
+    title: str,
+    artist: str,
+    duration: Optional[int],
+    image_qualities: Tuple[str, ...],
+    debug: bool = False
+) -> Tuple[Dict[str, Any], int]:
+    """Search JioSaavn and pick the best match; returns ``(body, status)``
+
+    Raises ``UpstreamUnavailable`` while the JioSaavn breaker or bulkhead rejects the call.
     """
-    title = request.args.get("title", type=str)
-    artist = request.args.get("artist", type=str)
-    debug = request.args.get("debug", default=0, type=int) == 1
-    
-    if not title or not artist:
-        return jsonify({"error": "Missing title or artist parameters"}), 400
-    
     # Construct JioSaavn API URL
     search_query = f"{title} {artist}"
     jiosaavn_api_url = (
@@ -56,86 +126,41 @@ def jiosaavn_search():
     try:
         t0 = time.time()
         print(f"[JioSaavn] /jiosaavn/search title='{title}' artist='{artist}' url='{jiosaavn_api_url}'")
-        response = requests.get(jiosaavn_api_url, headers={
+        # Identical concurrent searches share one upstream request
+        response = coalesce(jiosaavn_api_url, lambda: get_upstream("jiosaavn").call(lambda: http_client.get(jiosaavn_api_url, headers={
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/108.0.0.0 Safari/537.36'
-        }, timeout=15)
+        }, timeout=15), http_failed))
         dt_ms = int((time.time() - t0) * 1000)
         print(f"[JioSaavn] status={response.status_code} time_ms={dt_ms} len={len(response.text)} content_type='{response.headers.get('Content-Type')}'")
         
         if not response.ok:
             snippet = response.text[:300] if response.text else ''
             print(f"[JioSaavn][ERR] Non-200 response body_snippet='{snippet}'")
-            return jsonify({
+            return {
                 "error": f"JioSaavn API returned {response.status_code}: {response.text[:200]}"
-            }), 500
+            }, 500
         
         try:
             data = response.json()
         except Exception as e:
             snippet = response.text[:300]
             print(f"[JioSaavn][ERR] JSON parse failed: {e}. body_snippet='{snippet}'")
-            return jsonify({"error": "Invalid JSON from JioSaavn proxy"}), 502
+            return {"error": "Invalid JSON from JioSaavn proxy"}, 502
         
         results = data.get('results') or []
-        print(f"[JioSaavn] results_count={len(results)}")
+        print(f"[JioSaavn] results_count={len(results)} sample_titles={[r.get('title') for r in results[:3]]}")
         if not results:
-            return jsonify({"error": "Music stream not found in JioSaavn results"}), 404
+            return {"error": "Music stream not found in JioSaavn results"}, 404
         
-        # Process results
-        processed_results = [create_song_payload(raw_song) for raw_song in results]
-        print(f"[JioSaavn] processed_count={len(processed_results)} sample_titles={[r['name'] for r in processed_results[:3]]}")
-        
-        # Find matching track
-        matching_track = None
-
-        def _norm(text: str) -> str:
-            return normalize_string(text or "").strip().lower()
-
-        def _starts_either(a: str, b: str) -> bool:
-            # True if either starts with the other (helps with minor differences)
-            return a.startswith(b) or b.startswith(a)
-
-        for track in processed_results:
-            # Get all artist names
-            primary_artists = [artist['name'].strip() for artist in (track['artists']['primary'] or [])]
-            singers = [artist['name'].strip() for artist in (track['artists']['all'] or []) if artist.get('role') == 'singer']
-            all_artists = primary_artists + singers
-
-            # Check if artist matches
-            artist_in = _norm(artist)
-            artist_matches = False
-            if all_artists:
-                for track_artist_name in all_artists:
-                    if _starts_either(artist_in, _norm(track_artist_name)):
-                        artist_matches = True
-                        break
-
-            # Check if title matches
-            title_matches = _starts_either(_norm(title), _norm(track['name']))
-
-            if debug:
-                print(f"[JioSaavn][match_check] track='{track['name']}' artists={all_artists} title_matches={title_matches} artist_matches={artist_matches}")
-            if title_matches and (artist_matches or not all_artists):
-                matching_track = track
-                break
-
-        if not matching_track:
-            # Fallback: choose the first with title match only
-            title_only = next((t for t in processed_results if _starts_either(_norm(title), _norm(t['name']))), None)
-            if title_only:
-                matching_track = title_only
-                print("[JioSaavn] Falling back to title-only match")
-            else:
-                # Log a concise summary to help debugging on server
-                sample = [
-                    {
-                        "name": tr.get('name'),
-                        "artists": [a.get('name') for a in (tr.get('artists', {}).get('primary') or [])]
-                    }
-                    for tr in processed_results[:5]
-                ]
-                print(f"[JioSaavn] No exact match after processing. sample_candidates={sample}")
-                return jsonify({"error": "Music stream not found in JioSaavn results"}), 404
+        # Rank the raw results; only the chosen track is parsed and decrypted
+        raw_match, confidence = best_match(results, TrackQuery(title, artist, duration), debug)
+        if raw_match is None:
+            # Log a concise summary to help debugging on server
+            sample = [{"name": r.get('title'), "artists": raw_artist_names(r)} for r in results[:5]]
+            print(f"[JioSaavn] No match above threshold. best_confidence={confidence:.3f} sample_candidates={sample}")
+            return {"error": "Music stream not found in JioSaavn results"}, 404
+        print(f"[JioSaavn] matched='{raw_match.get('title')}' confidence={confidence:.3f}")
+        matching_track = parse_song(raw_match).to_dict(image_qualities=image_qualities)
         
         # Create final response
         final_response = {
@@ -150,7 +175,9 @@ def jiosaavn_search():
                 *(matching_track['artists']['featured'] or []),
                 *(matching_track['artists']['all'] or [])
             ],
-            "downloadUrl": matching_track['downloadUrl']
+            "downloadUrl": matching_track['downloadUrl'],
+            "downloadUrls": matching_track['downloadUrls'],
+            "confidence": round(confidence, 3)
         }
         
         if debug:
@@ -159,14 +186,93 @@ def jiosaavn_search():
                 "time_ms": dt_ms,
                 "matched_artists": matching_track['artists']
             }
-        return jsonify(final_response)
+        return final_response, 200
         
+    except UpstreamUnavailable:
+        raise
     except requests.exceptions.RequestException as e:
         print(f"[JioSaavn][ERR] Network error: {e}")
-        return jsonify({"error": f"Network error: {str(e)}"}), 500
+        return {"error": f"Network error: {str(e)}"}, 500
     except Exception as e:
         print(f"[JioSaavn][ERR] Unexpected error: {e}")
-        return jsonify({"error": f"Internal server error: {str(e)}"}), 500
+        return {"error": f"Internal server error: {str(e)}"}, 500
+
+
+@bp_jiosaavn.get("/jiosaavn/search")
+def jiosaavn_search():
+    """Search for music on JioSaavn
+    ---
+    parameters:
+      - name: title
+        in: query
+        type: string
+        required: true
+        description: Song title
+      - name: artist
+        in: query
+        type: string
+        required: true
+        description: Artist name
+      - name: duration
+        in: query
+        type: integer
+        required: false
+        description: Expected track duration in seconds (improves matching)
+      - name: video_id
+        in: query
+        type: string
+        required: false
+        description: YouTube videoId of the track, used as an extra resolution cache key
+      - name: image_qualities
+        in: query
+        type: string
+        required: false
+        description: Comma-separated image sizes to return (default 50x50,150x150,500x500)
+    responses:
+      200:
+        description: Song information with download URL and match confidence (0-1)
+      400:
+        description: Missing title or artist parameters
+      404:
+        description: Music stream not found
+      500:
+        description: Internal server error
+    """
+    title = request.args.get("title", type=str)
+    artist = request.args.get("artist", type=str)
+    duration = request.args.get("duration", type=int)
+    video_id = request.args.get("video_id", type=str)
+    debug = request.args.get("debug", default=0, type=int) == 1
+    
+    if not title or not artist:
+        return jsonify({"error": "Missing title or artist parameters"}), 400
+    try:
+        image_qualities = parse_image_qualities(request.args.get("image_qualities", type=str))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    if not debug and _resolutions is not None:
+        key, entry = _lookup_resolution(title, artist, video_id, duration, image_qualities)
+        if entry is not None:
+            stale = not entry.is_fresh()
+            if stale:
+                _schedule_refresh(key, title, artist, duration, image_qualities, video_id)
+            resp = jsonify(entry.value)
+            resp.headers["X-Cache"] = "STALE" if stale else "HIT"
+            resp.headers["Age"] = str(int(entry.age))
+            return resp
+
+    try:
+        body, status = _resolve_track(title, artist, duration, image_qualities, debug)
+    except UpstreamUnavailable as e:
+        print(f"[JioSaavn][ERR] {e}")
+        return unavailable_response(e)
+    if status == 200 and not debug:
+        _store_resolution(title, artist, video_id, duration, image_qualities, body)
+    resp = jsonify(body)
+    if not debug:
+        resp.headers["X-Cache"] = "MISS"
+    return resp, status
 
 
 @bp_jiosaavn.get("/jiosaavn/search/all")
@@ -185,6 +291,11 @@ def jiosaavn_search_all():
         required: false
         default: 10
         description: Number of results to return
+      - name: image_qualities
+        in: query
+        type: string
+        required: false
+        description: Comma-separated image sizes to return (default 50x50,150x150,500x500)
     responses:
       200:
         description: List of all matching songs
@@ -199,6 +310,10 @@ def jiosaavn_search_all():
     
     if not query:
         return jsonify({"error": "Missing query parameter 'q'"}), 400
+    try:
+        image_qualities = parse_image_qualities(request.args.get("image_qualities", type=str))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     
     # Construct JioSaavn API URL
     jiosaavn_api_url = (
@@ -216,9 +331,10 @@ def jiosaavn_search_all():
     try:
         t0 = time.time()
         print(f"[JioSaavn] /jiosaavn/search/all q='{query}' limit={limit} url='{jiosaavn_api_url}'")
-        response = requests.get(jiosaavn_api_url, headers={
+        # Identical concurrent searches share one upstream request
+        response = coalesce(jiosaavn_api_url, lambda: get_upstream("jiosaavn").call(lambda: http_client.get(jiosaavn_api_url, headers={
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/108.0.0.0 Safari/537.36'
-        }, timeout=15)
+        }, timeout=15), http_failed))
         dt_ms = int((time.time() - t0) * 1000)
         print(f"[JioSaavn] status={response.status_code} time_ms={dt_ms} len={len(response.text)} content_type='{response.headers.get('Content-Type')}'")
         
@@ -242,7 +358,7 @@ def jiosaavn_search_all():
             return jsonify({"results": []})
         
         # Process all results
-        processed_results = [create_song_payload(raw_song) for raw_song in results]
+        processed_results = create_song_payloads(results, image_qualities)
         print(f"[JioSaavn] processed_count={len(processed_results)} sample_titles={[r['name'] for r in processed_results[:3]]}")
         
         resp = {
@@ -254,6 +370,9 @@ def jiosaavn_search_all():
             resp["_debug"] = {"queried_url": jiosaavn_api_url, "time_ms": dt_ms}
         return jsonify(resp)
         
+    except UpstreamUnavailable as e:
+        print(f"[JioSaavn][ERR] {e}")
+        return unavailable_response(e)
     except requests.exceptions.RequestException as e:
         print(f"[JioSaavn][ERR] Network error: {e}")
         return jsonify({"error": f"Network error: {str(e)}"}), 500
@@ -1,6 +1,9 @@
 from flask import Blueprint, current_app, jsonify, request
 from youtubesearchpython import VideosSearch, ChannelsSearch, PlaylistsSearch
+from concurrent.futures import ThreadPoolExecutor, wait
 from typing import Optional
+from upstreams import UpstreamUnavailable, get_upstream, unavailable_response
+import os
 
 bp_youtube = Blueprint("youtube", __name__)
 
@@ -12,6 +15,57 @@ YT_FILTERS = {
     "videos"
 }
 
+# Search class per section, in the order results are returned for filter=all
+YT_SECTIONS = {
+    "videos": VideosSearch,
+    "channels": ChannelsSearch,
+    "playlists": PlaylistsSearch,
+}
+
+# Bounded pool shared by filter=all fan-outs; each section gets YT_SEARCH_DEADLINE seconds
+_search_pool = ThreadPoolExecutor(
+    max_workers=int(os.environ.get("YT_SEARCH_WORKERS", 24)),
+    thread_name_prefix="yt-search",
+)
+YT_SEARCH_DEADLINE = float(os.environ.get("YT_SEARCH_DEADLINE", 8))
+
+
+def _search(search_class, query: str, limit: int) -> dict:
+    """Run one youtubesearchpython search under the youtube_search circuit breaker."""
+    return get_upstream("youtube_search").call(lambda: search_class(query, limit=limit).result())
+
+
+def _search_section(section: str, query: str, limit: int) -> list:
+    return _search(YT_SECTIONS[section], query, limit).get("result", [])
+
+
+def _search_all(query: str, limit: int):
+    """Run every section concurrently; return (results, per-section status).
+
+    Raises ``UpstreamUnavailable`` when the breaker rejected every section.
+    """
+    futures = {section: _search_pool.submit(_search_section, section, query, limit) for section in YT_SECTIONS}
+    wait(futures.values(), timeout=YT_SEARCH_DEADLINE)
+
+    results = []
+    sections = {}
+    rejected = []
+    for section, future in futures.items():
+        if not future.done():
+            future.cancel()
+            sections[section] = {"status": "timeout"}
+        elif future.exception() is not None:
+            if isinstance(future.exception(), UpstreamUnavailable):
+                rejected.append(future.exception())
+            sections[section] = {"status": "error", "error": str(future.exception())}
+        else:
+            section_results = future.result()
+            results.extend(section_results)
+            sections[section] = {"status": "ok", "count": len(section_results)}
+    if len(rejected) == len(futures):
+        raise rejected[0]
+    return results, sections
+
 @bp_youtube.get("/yt_search")
 def youtube_search():
     """Search YouTube
@@ -37,9 +91,11 @@ def youtube_search():
         description: Maximum number of results
     responses:
       200:
-        description: YouTube search results
+        description: YouTube search results (filter=all adds per-section status; sections that time out or fail are omitted from results)
       400:
         description: Missing/invalid params
+      503:
+        description: YouTube search is shedding load (see Retry-After)
     """
     query = request.args.get("q", type=str)
     if not query:
@@ -52,28 +108,24 @@ def youtube_search():
         return jsonify({"error": f"Invalid filter. Allowed: {sorted(list(YT_FILTERS))}"}), 400
 
     try:
-        results = []
-        
-        if flt == "videos" or flt == "all":
-            videos_search = VideosSearch(query, limit=limit)
-            video_results = videos_search.result()
-            results.extend(video_results.get("result", []))
-        
-        if flt == "channels" or flt == "all":
-            channels_search = ChannelsSearch(query, limit=limit)
-            channel_results = channels_search.result()
-            results.extend(channel_results.get("result", []))
-        
-        if flt == "playlists" or flt == "all":
-            playlists_search = PlaylistsSearch(query, limit=limit)
-            playlist_results = playlists_search.result()
-            results.extend(playlist_results.get("result", []))
-        
+        if flt != "all":
+            return jsonify({
+                "query": query,
+                "filter": flt,
+                "results": _search_section(flt, query, limit)
+            })
+
+        results, sections = _search_all(query, limit)
+        if not any(s["status"] == "ok" for s in sections.values()):
+            return jsonify({"error": "Search failed: no section returned in time", "sections": sections}), 500
         return jsonify({
             "query": query,
             "filter": flt,
-            "results": results
+            "results": results,
+            "sections": sections
         })
+    except UpstreamUnavailable as e:
+        return unavailable_response(e)
     except Exception as e:
         return jsonify({"error": f"Search failed: {str(e)}"}), 500
 
@@ -95,8 +147,7 @@ def youtube_channel(channel_id: str):
     """
     try:
         # Get channel info using search
-        channels_search = ChannelsSearch(f"channel:{channel_id}", limit=1)
-        results = channels_search.result()
+        results = _search(ChannelsSearch, f"channel:{channel_id}", 1)
         channel_results = results.get("result", [])
         
         if not channel_results:
@@ -106,6 +157,8 @@ def youtube_channel(channel_id: str):
             "channel_id": channel_id,
             "channel_info": channel_results[0]
         })
+    except UpstreamUnavailable as e:
+        return unavailable_response(e)
     except Exception as e:
         return jsonify({"error": f"Failed to get channel info: {str(e)}"}), 500
 
@@ -138,13 +191,14 @@ def youtube_playlists():
     limit: int = request.args.get("limit", default=20, type=int)
 
     try:
-        playlists_search = PlaylistsSearch(query, limit=limit)
-        results = playlists_search.result()
+        results = _search(PlaylistsSearch, query, limit)
         playlist_results = results.get("result", [])
         
         return jsonify({
             "query": query,
             "playlists": playlist_results
         })
+    except UpstreamUnavailable as e:
+        return unavailable_response(e)
     except Exception as e:
         return jsonify({"error": f"Failed to search playlists: {str(e)}"}), 500
@@ -0,0 +1,71 @@
+"""Coalesce identical concurrent upstream calls into a single in-flight fetch."""
+from typing import Any, Callable, Dict, Optional, Tuple
+import json
+import threading
+
+
+class _Call:
+	__slots__ = ("done", "value", "error")
+
+	def __init__(self):
+		self.done = threading.Event()
+		self.value: Any = None
+		self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+	"""Run at most one call per key at a time; concurrent callers share its outcome."""
+
+	def __init__(self):
+		self._lock = threading.Lock()
+		self._calls: Dict[str, _Call] = {}
+
+	def do(self, key: str, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+		"""Return ``(value, shared)``; ``shared`` is True when another caller did the work.
+
+		Exceptions raised by ``fn`` are re-raised in every waiting caller.
+		"""
+		with self._lock:
+			call = self._calls.get(key)
+			if call is not None:
+				leader = False
+			else:
+				call = _Call()
+				self._calls[key] = call
+				leader = True
+
+		if not leader:
+			call.done.wait()
+			if call.error is not None:
+				raise call.error
+			return call.value, True
+
+		try:
+			call.value = fn()
+		except BaseException as e:
+			call.error = e
+			raise
+		finally:
+			with self._lock:
+				self._calls.pop(key, None)
+			call.done.set()
+		return call.value, False
+
+	def in_flight(self) -> int:
+		with self._lock:
+			return len(self._calls)
+
+
+# Process-wide group shared by every blueprint
+_group = SingleFlight()
+
+
+def flight_key(endpoint: str, params: Dict[str, Any]) -> str:
+	"""Normalized key for ``endpoint`` called with ``params``."""
+	return f"{endpoint}:{json.dumps(params, sort_keys=True, separators=(',', ':'), default=str)}"
+
+
+def coalesce(key: str, fn: Callable[[], Any]) -> Any:
+	"""Call ``fn`` unless an identical call (same ``key``) is already running, then share its result."""
+	value, _ = _group.do(key, fn)
+	return value
@@ -0,0 +1,194 @@
+"""In-memory cache for search-as-you-type suggestions.
+
+Keystroke traffic is highly redundant: "tay", "tayl" and "taylo" arrive within
+milliseconds of each other and mostly share their answers. Each suggestion
+source gets a ``SuggestionCache``, an LRU of normalized query -> suggestions
+that answers a query without going upstream when
+
+- the exact query is cached and fresh (``HIT``), or
+- the longest fresh cached prefix of the query had no suggestions at all, or
+  still has at least ``SUGGEST_MIN_LOCAL`` suggestions starting with the query
+  (``PREFIX``).
+
+On a miss the request first waits up to ``SUGGEST_DEBOUNCE_MS`` for an
+in-flight fetch of a shorter prefix (the previous keystroke) and retries the
+lookup; otherwise it fetches, coalescing identical concurrent misses.
+
+- ``SUGGEST_MAX_ENTRIES``: queries kept per source (default 20000)
+- ``SUGGEST_TTL``: seconds a query's suggestions stay fresh (default 900)
+- ``SUGGEST_TTL_SHORT``: TTL for queries of up to ``SUGGEST_SHORT_PREFIX`` characters (default 3600, 3)
+- ``SUGGEST_TTL_EMPTY``: TTL of empty answers, which may be upstream failures (default 60)
+- ``SUGGEST_MIN_LOCAL``: prefix matches needed to answer locally (default 5)
+- ``SUGGEST_DEBOUNCE_MS``: max wait for an in-flight shorter prefix (default 150)
+"""
+from cache import HIT, MISS
+from singleflight import coalesce, flight_key
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+import os
+import threading
+import time
+
+
+PREFIX = "PREFIX"
+
+
+def normalize_query(query: str) -> str:
+	"""Case- and whitespace-insensitive form of ``query`` used as the cache key."""
+	return " ".join(query.lower().split())
+
+
+class _Entry:
+	__slots__ = ("suggestions", "normalized", "expires_at")
+
+	def __init__(self, suggestions: List[str], ttl: float):
+		self.suggestions = suggestions
+		self.normalized = [normalize_query(s) if isinstance(s, str) else "" for s in suggestions]
+		self.expires_at = time.time() + ttl
+
+
+class SuggestionCache:
+	"""Thread-safe LRU of query -> suggestions for one upstream source."""
+
+	def __init__(
+		self,
+		name: str,
+		max_entries: int = 20000,
+		ttl: float = 900,
+		short_ttl: float = 3600,
+		empty_ttl: float = 60,
+		short_prefix: int = 3,
+		min_local: int = 5,
+		debounce: float = 0.15,
+	):
+		self.name = name
+		self.max_entries = max_entries
+		self.ttl = ttl
+		self.short_ttl = short_ttl
+		self.empty_ttl = empty_ttl
+		self.short_prefix = short_prefix
+		self.min_local = min_local
+		self.debounce = debounce
+		self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+		self._inflight: Dict[str, threading.Event] = {}
+		self._lock = threading.Lock()
+
+	def ttl_for(self, key: str, suggestions: List[str]) -> float:
+		"""Short prefixes are hot and stable, empty answers are kept only briefly."""
+		if not suggestions:
+			return self.empty_ttl
+		if len(key) <= self.short_prefix:
+			return self.short_ttl
+		return self.ttl
+
+	def _fresh(self, key: str) -> Optional[_Entry]:
+		# Caller holds the lock
+		entry = self._entries.get(key)
+		if entry is None:
+			return None
+		if entry.expires_at <= time.time():
+			del self._entries[key]
+			return None
+		self._entries.move_to_end(key)
+		return entry
+
+	def lookup(self, key: str) -> Tuple[Optional[List[str]], str]:
+		"""Return ``(suggestions, HIT|PREFIX)`` when ``key`` can be answered locally, else ``(None, MISS)``."""
+		with self._lock:
+			entry = self._fresh(key)
+			if entry is not None:
+				return entry.suggestions, HIT
+			for end in range(len(key) - 1, 0, -1):
+				entry = self._fresh(key[:end])
+				if entry is None:
+					continue
+				# The longest cached prefix is the most specific; shorter ones can't do better
+				if not entry.suggestions:
+					return [], PREFIX
+				matches = [s for s, n in zip(entry.suggestions, entry.normalized) if n.startswith(key)]
+				if len(matches) >= self.min_local:
+					return matches, PREFIX
+				break
+		return None, MISS
+
+	def store(self, key: str, suggestions: List[str]) -> None:
+		entry = _Entry(suggestions, self.ttl_for(key, suggestions))
+		with self._lock:
+			self._entries[key] = entry
+			self._entries.move_to_end(key)
+			while len(self._entries) > self.max_entries:
+				self._entries.popitem(last=False)
+
+	def _wait_for_prefix(self, key: str) -> bool:
+		"""Wait for the longest in-flight fetch of a prefix of ``key``; False when there is none."""
+		with self._lock:
+			event = next((self._inflight[key[:end]] for end in range(len(key) - 1, 0, -1) if key[:end] in self._inflight), None)
+		if event is None:
+			return False
+		return event.wait(self.debounce)
+
+	def get(self, query: str, fetch: Callable[[str], Optional[List[str]]]) -> Tuple[Optional[List[str]], str]:
+		"""Return ``(suggestions, state)`` for ``query``, calling ``fetch(query)`` only when it can't be answered locally.
+
+		A ``None`` result from ``fetch`` (upstream unavailable) is returned but not cached.
+		"""
+		key = normalize_query(query)
+		suggestions, state = self.lookup(key)
+		if suggestions is not None:
+			return suggestions, state
+		if self._wait_for_prefix(key):
+			suggestions, state = self.lookup(key)
+			if suggestions is not None:
+				return suggestions, state
+
+		def load():
+			event = threading.Event()
+			with self._lock:
+				self._inflight[key] = event
+			try:
+				result = fetch(query)
+				if result is not None:
+					self.store(key, result)
+				return result
+			finally:
+				with self._lock:
+					self._inflight.pop(key, None)
+				event.set()
+
+		return coalesce(flight_key(f"suggestions_{self.name}", {"q": key}), load), MISS
+
+	def clear(self) -> None:
+		with self._lock:
+			self._entries.clear()
+
+
+# One cache per suggestion source (and locale, for locale-dependent sources), shared process-wide
+_caches: Dict[str, SuggestionCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_suggestion_cache(source: str, locale: Optional[Tuple[str, str]] = None) -> SuggestionCache:
+	"""Return the process-wide ``SuggestionCache`` for ``source``, creating it from the environment.
+
+	Sources whose suggestions depend on the ``hl``/``gl`` locale pass it, and get
+	a separate cache (and separate in-flight fetches) per locale.
+	"""
+	if locale is not None:
+		source = f"{source}_{locale[0]}_{locale[1]}"
+	cache = _caches.get(source)
+	if cache is None:
+		with _caches_lock:
+			cache = _caches.get(source)
+			if cache is None:
+				cache = SuggestionCache(
+					source,
+					max_entries=int(os.environ.get("SUGGEST_MAX_ENTRIES", 20000)),
+					ttl=float(os.environ.get("SUGGEST_TTL", 900)),
+					short_ttl=float(os.environ.get("SUGGEST_TTL_SHORT", 3600)),
+					empty_ttl=float(os.environ.get("SUGGEST_TTL_EMPTY", 60)),
+					short_prefix=int(os.environ.get("SUGGEST_SHORT_PREFIX", 3)),
+					min_local=int(os.environ.get("SUGGEST_MIN_LOCAL", 5)),
+					debounce=int(os.environ.get("SUGGEST_DEBOUNCE_MS", 150)) / 1000,
+				)
+				_caches[source] = cache
+	return cache
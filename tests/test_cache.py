@@ -0,0 +1,78 @@
+import json
+import time
+from types import SimpleNamespace
+
+import pytest
+from flask import Flask, request
+
+import cache
+from cache import MemoryBackend, ResponseCache, cached_json
+from json_provider import init_json
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = SimpleNamespace(value=time.time())
+    monkeypatch.setattr(cache, "time", SimpleNamespace(time=lambda: now.value))
+    return now
+
+
+@pytest.fixture
+def upstream():
+    return {"payload": {"a": 1, "b": 2}, "calls": 0}
+
+
+@pytest.fixture
+def client(upstream):
+    app = Flask(__name__)
+    init_json(app)
+    # Stale entries are kept for a long while so the full payload outlives its projection
+    app.config["RESPONSE_CACHE"] = ResponseCache(MemoryBackend(), {"charts": 2}, {"charts": 3600})
+
+    def load():
+        upstream["calls"] += 1
+        return dict(upstream["payload"])
+
+    @app.route("/charts")
+    def charts():
+        return cached_json("charts", {}, load, request.args.get("fields"))
+
+    return app.test_client()
+
+
+def test_projection_is_cached_under_its_own_key(client, upstream, clock):
+    first = client.get("/charts?fields=a")
+    assert json.loads(first.data) == {"a": 1}
+    assert first.headers["X-Cache"] == "MISS"
+    second = client.get("/charts?fields=a")
+    assert second.headers["X-Cache"] == "HIT"
+    assert upstream["calls"] == 1
+
+
+def test_stale_projection_is_not_rebuilt_from_stale_full_payload(client, upstream, clock):
+    client.get("/charts")
+    client.get("/charts?fields=a")
+    upstream["payload"] = {"a": 9, "b": 2}
+    clock.value += 5
+
+    # Stale projection: served once while it revalidates in the background
+    assert client.get("/charts?fields=a").headers["X-Cache"] == "STALE"
+    for _ in range(100):
+        if not cache._revalidating:
+            break
+        time.sleep(0.01)
+
+    resp = client.get("/charts?fields=a")
+    assert resp.headers["X-Cache"] == "HIT"
+    assert json.loads(resp.data) == {"a": 9}
+
+
+def test_projection_miss_reloads_stale_full_payload(client, upstream, clock):
+    client.get("/charts")
+    upstream["payload"] = {"a": 9, "b": 2}
+    clock.value += 5
+
+    resp = client.get("/charts?fields=a")
+    assert resp.headers["X-Cache"] == "MISS"
+    assert json.loads(resp.data) == {"a": 9}
+    assert upstream["calls"] == 2
@@ -0,0 +1,97 @@
+import pytest
+
+from jiosaavn_match import MIN_CONFIDENCE, TrackQuery, best_match, split_artists
+
+
+def song(title, *artists, duration=None):
+    more_info = {"artistMap": {"primary_artists": [{"name": name} for name in artists]}}
+    if duration is not None:
+        more_info["duration"] = str(duration)
+    return {"title": title, "more_info": more_info}
+
+
+@pytest.mark.parametrize("title, artist, candidate", [
+    ("Tum Hi Ho", "Arijit Singh", song("Tum Kya Mile", "Arijit Singh")),
+    ("Tum Hi Ho", "Arijit Singh", song("Ae Dil Hai Mushkil", "Arijit Singh")),
+    ("Tum Hi Ho", "Arijit Singh", song("Tu Hi Hai", "Arijit Singh")),
+    ("Love Story", "Taylor Swift", song("Love Me Like You Do", "Taylor Swift")),
+])
+def test_same_artist_different_title_is_rejected(title, artist, candidate):
+    match, confidence = best_match([candidate], TrackQuery(title, artist))
+    assert match is None
+    assert confidence < MIN_CONFIDENCE
+
+
+def test_same_artist_near_misses_do_not_beat_the_real_song():
+    results = [
+        song("Tu Hi Hai", "Arijit Singh"),
+        song("Tum Kya Mile", "Arijit Singh"),
+        song("Tum Hi Ho (From \"Aashiqui 2\")", "Arijit Singh", "Mithoon"),
+    ]
+    match, _ = best_match(results, TrackQuery("Tum Hi Ho", "Arijit Singh"))
+    assert match is results[2]
+
+
+def test_matching_title_with_wrong_artist_is_rejected():
+    match, _ = best_match([song("Love Story", "Someone Else")], TrackQuery("Love Story", "Taylor Swift"))
+    assert match is None
+
+
+def test_exact_match_is_accepted():
+    match, confidence = best_match([song("Love Story", "Taylor Swift", duration=235)], TrackQuery("Love Story", "Taylor Swift", 236))
+    assert match is not None
+    assert confidence > 0.99
+
+
+def test_requested_artist_is_never_split_on_x():
+    assert split_artists("X") == ("x",)
+    assert split_artists("Malcolm X") == ("malcolm x",)
+    assert split_artists("A x B", collab_x=True) == ("a", "b")
+    assert split_artists("Malcolm X", collab_x=True) == ("malcolm x",)
+
+
+def test_single_letter_artist_still_counts():
+    query = TrackQuery("Love", "X")
+    assert query.artists
+    match, _ = best_match([song("Love", "Someone Else")], query)
+    assert match is None
+    match, _ = best_match([song("Love", "X")], query)
+    assert match is not None
+
+
+def test_collab_x_credit_is_split_on_the_candidate():
+    query = TrackQuery("Song", "Artist B")
+    assert query.artist_score(["Artist A x Artist B"]) == 1.0
+
+
+@pytest.mark.parametrize("title, candidate_title", [
+    ("Love Story", "Love Story (Taylor's Version)"),
+    ("Blinding Lights", "Blinding Lights (Radio Edit)"),
+    ("Blinding Lights", "Blinding Lights - Remastered 2020"),
+    ("Tum Hi Ho", "Tum Hee Ho"),
+    ("Levels", "Levels (Original Mix)"),
+])
+def test_decorated_and_transliterated_titles_match(title, candidate_title):
+    match, confidence = best_match([song(candidate_title, "Artist")], TrackQuery(title, "Artist"))
+    assert match is not None
+    assert confidence > 0.99
+
+
+@pytest.mark.parametrize("candidate_title", ["Despacito (Remix)", "Despacito - Live", "Despacito (Acoustic)"])
+def test_different_version_is_penalized(candidate_title):
+    query = TrackQuery("Despacito", "Luis Fonsi")
+    remix = song(candidate_title, "Luis Fonsi")
+    _, confidence = best_match([remix], query)
+    # Below the confidence that makes a resolution durable
+    assert confidence < 0.9
+    original = song("Despacito", "Luis Fonsi")
+    match, _ = best_match([remix, original], query)
+    assert match is original
+
+
+def test_requested_version_is_preferred():
+    query = TrackQuery("Despacito (Remix)", "Luis Fonsi")
+    remix = song("Despacito (Remix)", "Luis Fonsi")
+    match, confidence = best_match([song("Despacito", "Luis Fonsi"), remix], query)
+    assert match is remix
+    assert confidence > 0.99
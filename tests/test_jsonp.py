@@ -0,0 +1,107 @@
+import json
+
+import pytest
+
+import jsonp
+from jsonp import JSONPError, loads, parse_suggestions, unwrap
+
+
+def legacy_parse_suggestions(content):
+    """The regex/find + json.loads parser jsonp replaced, for parity checks"""
+    if not content.startswith("["):
+        start_idx = content.find('(')
+        end_idx = content.rfind(')')
+        if start_idx == -1 or end_idx == -1:
+            return None
+        content = content[start_idx + 1:end_idx]
+    data = json.loads(content)
+    if len(data) < 2 or not isinstance(data[1], list):
+        return None
+    suggestions = []
+    for item in data[1]:
+        if isinstance(item, list) and len(item) > 0:
+            suggestions.append(item[0])
+        elif isinstance(item, str):
+            suggestions.append(item)
+    return suggestions
+
+
+GOOGLE_AC = 'window.google.ac.h(["tay",[["taylor swift",0,[512]],["taylor swift songs",0],["tayo"]],{"k":1,"q":"x"}])'
+FIREFOX = '["tay",["taylor swift","taylor swift songs","tayo"]]'
+
+PAYLOADS = {
+    "google_ac_callback": GOOGLE_AC,
+    "bare_array": FIREFOX,
+    "trailing_semicolon": GOOGLE_AC + ";",
+    "other_callback": 'google.sbox.p50(["tay",[["taylor swift",0]]])',
+    "whitespace": "  \n" + GOOGLE_AC + " ;\n",
+    "unicode": 'window.google.ac.h(["beyo",[["beyonc\\u00e9",0],["beyoncé live",0]]])',
+}
+
+
+@pytest.mark.parametrize("name", sorted(PAYLOADS))
+def test_parse_suggestions_formats(name):
+    suggestions = parse_suggestions(PAYLOADS[name])
+    assert suggestions and all(isinstance(s, str) for s in suggestions)
+
+
+@pytest.mark.parametrize("name", sorted(PAYLOADS))
+def test_matches_legacy_parser(name):
+    payload = PAYLOADS[name]
+    assert parse_suggestions(payload) == legacy_parse_suggestions(payload.strip())
+    assert parse_suggestions(payload.encode("utf-8")) == legacy_parse_suggestions(payload.strip())
+
+
+def test_google_ac_items():
+    assert parse_suggestions(GOOGLE_AC) == ["taylor swift", "taylor swift songs", "tayo"]
+
+
+def test_bom_and_xssi_guard():
+    assert parse_suggestions(b"\xef\xbb\xbf" + GOOGLE_AC.encode("utf-8")) == ["taylor swift", "taylor swift songs", "tayo"]
+    assert parse_suggestions(b"\xef\xbb\xbf" + FIREFOX.encode("utf-8")) == ["taylor swift", "taylor swift songs", "tayo"]
+    assert loads(")]}'\n" + FIREFOX) == ["tay", ["taylor swift", "taylor swift songs", "tayo"]]
+
+
+def test_empty_suggestion_list():
+    assert parse_suggestions('window.google.ac.h(["zzqx",[],{"q":"x"}])') == []
+    assert parse_suggestions('["zzqx",[]]') == []
+
+
+def test_skips_malformed_items():
+    assert parse_suggestions('["q",["a",[],["b",1],2,null]]') == ["a", "b"]
+
+
+@pytest.mark.parametrize("payload", [
+    "",
+    "window.google.ac.h(",
+    'window.google.ac.h(["tay",[["taylor swift"',
+    "<html>rate limited</html>",
+    "callback({not json})",
+])
+def test_malformed_input_raises(payload):
+    with pytest.raises(JSONPError):
+        parse_suggestions(payload)
+
+
+@pytest.mark.parametrize("payload", [
+    '{"q": "tay"}',
+    '["tay"]',
+    '["tay", {"a": 1}]',
+    'window.google.ac.h("tay")',
+    "42",
+])
+def test_non_list_payloads_raise(payload):
+    with pytest.raises(JSONPError):
+        parse_suggestions(payload)
+
+
+def test_unwrap_leaves_bare_json():
+    assert unwrap(FIREFOX) == FIREFOX.encode("utf-8")
+
+
+def test_stdlib_fallback(monkeypatch):
+    monkeypatch.setattr(jsonp, "_decode", json.loads)
+    monkeypatch.setattr(jsonp, "_DecodeError", json.JSONDecodeError)
+    assert parse_suggestions(GOOGLE_AC) == ["taylor swift", "taylor swift songs", "tayo"]
+    with pytest.raises(JSONPError):
+        parse_suggestions("callback({not json})")
@@ -0,0 +1,233 @@
+"""Per-upstream bulkheads with adaptive concurrency limits and circuit breakers.
+
+Every call to an upstream (YouTube Music, YouTube search, each suggest
+endpoint, JioSaavn) goes through its ``Upstream``. For YouTube Music that is
+each HTTP request a client sends, so a many-page playlist isn't judged as
+one slow call:
+
+- At most ``limit`` calls run at once. The limit grows by ``1/limit`` after
+  each fast success and shrinks by a quarter after each failure or slow call
+  (AIMD). Calls over the limit wait up to ``queue_ms`` for a slot and then
+  fail, so a slow upstream can't tie up every server thread.
+- Failures and calls slower than ``slow_ms`` count against a rolling window
+  of the last ``window`` calls. At ``failure_ratio`` (with at least
+  ``min_calls`` samples) the breaker opens. While open, calls fail fast with
+  ``UpstreamUnavailable`` for ``open_seconds``, then a single probe call
+  decides whether it closes again. Calls admitted before the breaker opened
+  (its previous ``generation``) still release their slot when they finish, but
+  their outcome no longer counts.
+
+Settings come from ``UPSTREAM_<NAME>_<SETTING>`` or ``UPSTREAM_<SETTING>``
+environment variables, e.g. ``UPSTREAM_JIOSAAVN_SLOW_MS=3000`` or
+``UPSTREAM_OPEN_SECONDS=30``. ``stats()`` is reported at ``/health``.
+"""
+from flask import jsonify
+from collections import deque
+from typing import Any, Callable, Dict, Optional, Tuple
+import os
+import threading
+import time
+
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class UpstreamUnavailable(RuntimeError):
+	"""Raised instead of calling an upstream whose breaker is open or bulkhead is full."""
+
+	def __init__(self, upstream: str, reason: str, retry_after: float = 1):
+		super().__init__(f"{upstream} is temporarily unavailable ({reason})")
+		self.upstream = upstream
+		self.retry_after = max(1, int(retry_after + 0.999))
+
+
+class Upstream:
+	"""Bulkhead, adaptive concurrency limit and circuit breaker for one upstream."""
+
+	def __init__(
+		self,
+		name: str,
+		initial_limit: int = 16,
+		min_limit: int = 1,
+		max_limit: int = 32,
+		slow_ms: float = 5000,
+		window: int = 20,
+		min_calls: int = 10,
+		failure_ratio: float = 0.5,
+		open_seconds: float = 15,
+		queue_ms: float = 1000,
+		is_failure: Callable[[BaseException], bool] = lambda exc: True,
+	):
+		self.name = name
+		self.min_limit = min_limit
+		self.max_limit = max_limit
+		self.slow = slow_ms / 1000
+		self.min_calls = min_calls
+		self.failure_ratio = failure_ratio
+		self.open_seconds = open_seconds
+		self.queue_timeout = queue_ms / 1000
+		self.is_failure = is_failure
+		self.limit = float(initial_limit)
+		self.state = CLOSED
+		self.opened_at = 0.0
+		# Bumped each time the breaker opens, so outcomes of calls admitted earlier can be told apart
+		self.generation = 0
+		self.probing = False
+		self.inflight = 0
+		self.latency = 0.0
+		self.counters = {"calls": 0, "failures": 0, "slow": 0, "rejected": 0, "opened": 0}
+		self._outcomes: deque = deque(maxlen=window)
+		self._lock = threading.Condition()
+
+	def _acquire(self) -> Tuple[int, bool]:
+		"""Take a slot; returns the breaker generation the call runs under and whether it is the recovery probe."""
+		deadline = time.monotonic() + self.queue_timeout
+		with self._lock:
+			while True:
+				if self.state == OPEN:
+					remaining = self.open_seconds - (time.monotonic() - self.opened_at)
+					if remaining > 0:
+						self.counters["rejected"] += 1
+						raise UpstreamUnavailable(self.name, "circuit open", remaining)
+					self.state = HALF_OPEN
+				if self.state == HALF_OPEN:
+					if self.probing:
+						self.counters["rejected"] += 1
+						raise UpstreamUnavailable(self.name, "recovery probe in progress")
+					# Calls left over from before the breaker opened don't hold the probe back
+					self.probing = True
+					self.inflight += 1
+					return self.generation, True
+				if self.inflight < int(self.limit):
+					self.inflight += 1
+					return self.generation, False
+				remaining = deadline - time.monotonic()
+				if remaining <= 0:
+					self.counters["rejected"] += 1
+					raise UpstreamUnavailable(self.name, f"{self.inflight} calls in flight")
+				self._lock.wait(remaining)
+
+	def _open(self) -> None:
+		# Caller holds the lock
+		self.state = OPEN
+		self.opened_at = time.monotonic()
+		self.generation += 1
+		self.counters["opened"] += 1
+		self._outcomes.clear()
+		print(f"[Upstream] {self.name} circuit opened for {self.open_seconds:g}s")
+
+	def _release(self, failed: bool, elapsed: float, generation: int, probe: bool) -> None:
+		with self._lock:
+			self.inflight -= 1
+			self._lock.notify()
+			self.counters["calls"] += 1
+			self.latency = elapsed if self.counters["calls"] == 1 else self.latency + 0.2 * (elapsed - self.latency)
+			slow = elapsed > self.slow
+			if failed:
+				self.counters["failures"] += 1
+			if slow:
+				self.counters["slow"] += 1
+			bad = failed or slow
+			if bad:
+				self.limit = max(self.min_limit, self.limit * 0.75)
+			else:
+				self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+
+			if probe:
+				self.probing = False
+				if bad:
+					self._open()
+				else:
+					self.state = CLOSED
+					print(f"[Upstream] {self.name} circuit closed")
+				return
+			if generation != self.generation or self.state != CLOSED:
+				return
+			self._outcomes.append(bad)
+			if len(self._outcomes) >= self.min_calls and sum(self._outcomes) / len(self._outcomes) >= self.failure_ratio:
+				self._open()
+
+	def call(self, fn: Callable[[], Any], failed: Optional[Callable[[Any], bool]] = None) -> Any:
+		"""Run ``fn`` under this upstream's limits; ``failed(result)`` flags bad results such as 5xx responses."""
+		generation, probe = self._acquire()
+		t0 = time.monotonic()
+		bad = True
+		try:
+			result = fn()
+			bad = failed is not None and failed(result)
+			return result
+		except Exception as e:
+			bad = self.is_failure(e)
+			raise
+		finally:
+			self._release(bad, time.monotonic() - t0, generation, probe)
+
+	def stats(self) -> Dict[str, Any]:
+		with self._lock:
+			return {
+				"state": self.state,
+				"limit": int(self.limit),
+				"inflight": self.inflight,
+				"latency_ms": int(self.latency * 1000),
+				**self.counters,
+			}
+
+
+def http_failed(response: Any) -> bool:
+	"""``failed`` predicate for ``requests`` responses."""
+	return response.status_code == 429 or response.status_code >= 500
+
+
+def _setting(name: str, key: str, default: float) -> float:
+	raw = os.environ.get(f"UPSTREAM_{name.upper()}_{key}", os.environ.get(f"UPSTREAM_{key}"))
+	return float(raw) if raw is not None else default
+
+
+def _build(name: str, slow_ms: float) -> Upstream:
+	# The initial limit covers one batch request's fan-out (BATCH_WORKERS, 16)
+	return Upstream(
+		name,
+		initial_limit=int(_setting(name, "INITIAL_LIMIT", 16)),
+		min_limit=int(_setting(name, "MIN_LIMIT", 1)),
+		max_limit=int(_setting(name, "MAX_LIMIT", 32)),
+		slow_ms=_setting(name, "SLOW_MS", slow_ms),
+		window=int(_setting(name, "WINDOW", 20)),
+		min_calls=int(_setting(name, "MIN_CALLS", 10)),
+		failure_ratio=_setting(name, "FAILURE_RATIO", 0.5),
+		open_seconds=_setting(name, "OPEN_SECONDS", 15),
+		queue_ms=_setting(name, "QUEUE_MS", 1000),
+	)
+
+
+UPSTREAMS: Dict[str, Upstream] = {
+	"ytmusic": _build("ytmusic", 5000),
+	"youtube_search": _build("youtube_search", 6000),
+	"jiosaavn": _build("jiosaavn", 5000),
+}
+_register_lock = threading.Lock()
+
+
+def register_upstream(name: str, slow_ms: float) -> Upstream:
+	"""Add an upstream (configured like the built-in ones), or return the one already registered as ``name``."""
+	with _register_lock:
+		if name not in UPSTREAMS:
+			UPSTREAMS[name] = _build(name, slow_ms)
+		return UPSTREAMS[name]
+
+
+def get_upstream(name: str) -> Upstream:
+	return UPSTREAMS[name]
+
+
+def stats() -> Dict[str, Dict[str, Any]]:
+	return {name: upstream.stats() for name, upstream in UPSTREAMS.items()}
+
+
+def unavailable_response(exc: UpstreamUnavailable):
+	"""503 fast-fail response telling clients when to retry."""
+	resp = jsonify({"error": str(exc), "upstream": exc.upstream})
+	resp.status_code = 503
+	resp.headers["Retry-After"] = str(exc.retry_after)
+	return resp
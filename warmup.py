@@ -0,0 +1,208 @@
+"""Background pre-warming of the response cache for hot endpoints.
+
+Each configured path is requested through the app itself with a cache refresh
+flag, so its payload is re-fetched from upstream and stored before user traffic
+needs it. ``create_app`` only sets the scheduler up; the serving entry points
+start it (``start_warmup``) when the process starts serving: gunicorn's
+``post_worker_init``, ``create_asgi_app`` and, with ``WARMUP_ON_START=1``, the
+module-level app used by waitress. Anything else (e.g. the dev server) starts
+it with its first request. Importing the app starts no threads, and nothing is
+scheduled when caching is disabled.
+Items run once at startup, then again shortly before the entry they stored
+expires (``REFRESH_AHEAD`` of its TTL early, with jitter), never more than
+``WARMUP_CONCURRENCY`` at a time.
+
+- ``WARMUP_ENABLED``: ``0`` disables the scheduler (default ``1``)
+- ``WARMUP_ITEMS``: JSON list of paths or ``{"path": ..., "interval": ...}`` objects;
+  an ``interval`` replaces the TTL-based schedule for that item
+- ``WARMUP_INTERVAL``: seconds before retrying an item whose response wasn't cached (default 300)
+- ``WARMUP_JITTER``: +/- fraction applied to every interval (default 0.1)
+- ``WARMUP_CONCURRENCY``: max warmups running at once (default 2)
+- ``WARMUP_LOCK``: lock file path; when set, only the process holding the lock
+  warms the (shared) cache and the others take over if it exits
+"""
+from cache import CACHE_EXPIRES_ENVIRON_KEY, REFRESH_ENVIRON_KEY, NullBackend
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+import fcntl
+import heapq
+import json
+import os
+import random
+import threading
+import time
+
+
+# Seconds between attempts to take over the warmup lock
+LOCK_RETRY = 30
+
+# Share of an entry's remaining TTL left when it is refreshed
+REFRESH_AHEAD = 0.1
+
+# Never refresh an item more often than this, in seconds
+MIN_INTERVAL = 30
+
+# What index.html requests on every page load
+DEFAULT_WARMUP_PATHS = [
+	"/api/charts?country=US",
+	"/api/search?q=trending&filter=songs&limit=50",
+	"/api/moods",
+]
+
+
+class WarmupItem:
+	__slots__ = ("path", "interval")
+
+	def __init__(self, path: str, interval: Optional[float] = None):
+		self.path = path
+		self.interval = interval
+
+
+class WarmupScheduler:
+	"""Keeps ``items`` hot by periodically re-requesting them through ``app``."""
+
+	def __init__(
+		self,
+		app,
+		items: List[WarmupItem],
+		retry_interval: float = 300,
+		jitter: float = 0.1,
+		concurrency: int = 2,
+		lock_path: Optional[str] = None,
+	):
+		self.app = app
+		self.items = items
+		self.retry_interval = retry_interval
+		self.jitter = jitter
+		self.lock_path = lock_path
+		self._lock_file = None
+		self._pool = ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="warmup")
+		self._queue: list = []
+		self._cond = threading.Condition()
+		self._stopped = False
+		self._thread: Optional[threading.Thread] = None
+		self._started = threading.Lock()
+
+	def start(self) -> None:
+		"""Start scheduling; later calls do nothing."""
+		if not self._started.acquire(blocking=False):
+			return
+		with self._cond:
+			# Spread the startup round over a second so items don't all fire together
+			for index, item in enumerate(self.items):
+				heapq.heappush(self._queue, (time.time() + random.uniform(0, 1), index, item))
+		self._thread = threading.Thread(target=self._run, name="warmup-scheduler", daemon=True)
+		self._thread.start()
+
+	def stop(self) -> None:
+		with self._cond:
+			self._stopped = True
+			self._cond.notify_all()
+		self._pool.shutdown(wait=False)
+
+	def _try_lock(self) -> bool:
+		handle = open(self.lock_path, "a")
+		try:
+			fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+		except OSError:
+			handle.close()
+			return False
+		# Held until the process exits
+		self._lock_file = handle
+		print(f"[Warmup] pid {os.getpid()} holds {self.lock_path}, warming the cache")
+		return True
+
+	def _run(self) -> None:
+		if self.lock_path:
+			while not self._try_lock():
+				with self._cond:
+					self._cond.wait(LOCK_RETRY)
+					if self._stopped:
+						return
+		while True:
+			with self._cond:
+				while not self._stopped and (not self._queue or self._queue[0][0] > time.time()):
+					timeout = self._queue[0][0] - time.time() if self._queue else None
+					self._cond.wait(timeout)
+				if self._stopped:
+					return
+				_, index, item = heapq.heappop(self._queue)
+			self._pool.submit(self._warm, index, item)
+
+	def _warm(self, index: int, item: WarmupItem) -> None:
+		t0 = time.time()
+		expires_at = None
+		try:
+			# cached_entry appends the expiry of every entry it stores for this path
+			expiries: List[float] = []
+			with self.app.test_client() as client:
+				resp = client.get(item.path, environ_overrides={REFRESH_ENVIRON_KEY: True, CACHE_EXPIRES_ENVIRON_KEY: expiries})
+			expires_at = min(expiries, default=None)
+			print(f"[Warmup] {item.path} status={resp.status_code} time_ms={int((time.time() - t0) * 1000)}")
+		except Exception as e:
+			print(f"[Warmup][ERR] {item.path} failed: {e}")
+		finally:
+			self._reschedule(index, item, expires_at)
+
+	def _next_interval(self, item: WarmupItem, expires_at: Optional[float]) -> float:
+		if item.interval is not None:
+			return item.interval
+		if expires_at is None:
+			return self.retry_interval
+		return max(MIN_INTERVAL, (expires_at - time.time()) * (1 - REFRESH_AHEAD))
+
+	def _reschedule(self, index: int, item: WarmupItem, expires_at: Optional[float] = None) -> None:
+		delay = self._next_interval(item, expires_at) * (1 + random.uniform(-self.jitter, self.jitter))
+		with self._cond:
+			if not self._stopped:
+				heapq.heappush(self._queue, (time.time() + delay, index, item))
+				self._cond.notify()
+
+
+def _load_items() -> List[WarmupItem]:
+	raw = os.environ.get("WARMUP_ITEMS")
+	specs = json.loads(raw) if raw else DEFAULT_WARMUP_PATHS
+	items = []
+	for spec in specs:
+		if isinstance(spec, str):
+			items.append(WarmupItem(spec))
+		else:
+			interval = spec.get("interval")
+			items.append(WarmupItem(spec["path"], float(interval) if interval is not None else None))
+	return items
+
+
+def init_warmup(app) -> Optional[WarmupScheduler]:
+	"""Set up the warmup scheduler for ``app`` without starting it.
+
+	``start_warmup`` starts it; otherwise the first request ``app`` serves does.
+	Nothing is scheduled with ``WARMUP_ENABLED=0`` or when the response cache is disabled.
+	"""
+	if os.environ.get("WARMUP_ENABLED", "1") == "0":
+		return None
+	if isinstance(app.config["RESPONSE_CACHE"].backend, NullBackend):
+		print("[Warmup] response cache disabled, not warming")
+		return None
+	scheduler = WarmupScheduler(
+		app,
+		_load_items(),
+		retry_interval=float(os.environ.get("WARMUP_INTERVAL", 300)),
+		jitter=float(os.environ.get("WARMUP_JITTER", 0.1)),
+		concurrency=int(os.environ.get("WARMUP_CONCURRENCY", 2)),
+		lock_path=os.environ.get("WARMUP_LOCK") or None,
+	)
+	app.config["WARMUP_SCHEDULER"] = scheduler
+
+	@app.before_request
+	def start_warmup_on_request() -> None:
+		# Fallback for servers without a startup hook
+		scheduler.start()
+
+	return scheduler
+
+
+def start_warmup(app) -> None:
+	"""Start ``app``'s warmup scheduler, if it has one; called by the serving entry points."""
+	scheduler = app.config.get("WARMUP_SCHEDULER")
+	if scheduler is not None:
+		scheduler.start()
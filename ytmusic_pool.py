@@ -0,0 +1,271 @@
+"""Pool of YTMusic clients leased per request.
+
+Each client owns its ``requests`` session, so concurrent requests no longer
+share one session. Clients are grouped by locale (``hl`` language, ``gl``
+location, taken from the request's ``hl``/``gl`` query parameters) so results
+for different countries never cross. Unsupported ``hl``/``gl`` values are
+rejected with a 400, and at most ``YTMUSIC_MAX_LOCALES`` locales keep clients:
+past that, the least recently used fully idle locale is dropped, and a new
+locale is refused with a 503 when every other one is busy. A request leases one client on first use
+(``lease_client``), keeps it in ``flask.g`` and returns it when the app context
+is torn down. Clients whose last ``YTMUSIC_MAX_ERRORS`` calls failed in transport
+or with HTTP 429/5xx (not e.g. a 4xx for a bad id) or that are
+older than ``YTMUSIC_MAX_AGE`` seconds are replaced with fresh ones.
+
+- ``YTMUSIC_POOL_SIZE``: clients per locale (default 16)
+- ``YTMUSIC_LEASE_TIMEOUT``: seconds to wait for a free client before answering 503 (default 10)
+- ``YTMUSIC_MAX_LOCALES``: locales with clients at once (default 8)
+- ``YTMUSIC_MAX_ERRORS``: consecutive failed calls before a client is recycled (default 3)
+- ``YTMUSIC_MAX_AGE``: seconds before a client is recycled (default 3600)
+- ``YTMUSIC_HL`` / ``YTMUSIC_GL``: default locale (default ``en`` / server-determined)
+"""
+from flask import current_app, g, has_app_context, has_request_context, jsonify, request
+from ytmusicapi import YTMusic
+from ytmusicapi.constants import SUPPORTED_LANGUAGES, SUPPORTED_LOCATIONS
+from ytmusicapi.exceptions import YTMusicServerError
+from upstreams import UpstreamUnavailable, get_upstream, http_failed
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import os
+import re
+import requests
+import threading
+import time
+
+
+Locale = Tuple[str, str]
+
+DEFAULT_LOCALE: Locale = (os.environ.get("YTMUSIC_HL", "en"), os.environ.get("YTMUSIC_GL", "").upper())
+
+
+class PoolExhausted(UpstreamUnavailable):
+	"""No client became free within the lease timeout (served as a 503 like other upstream overloads)."""
+
+	def __init__(self, reason: str):
+		super().__init__("ytmusic", reason)
+
+
+def locale_error(hl: Optional[str], gl: Optional[str]) -> Optional[str]:
+	"""Why ``hl``/``gl`` can't be used for a YTMusic client, or None when both are supported."""
+	if hl and hl not in SUPPORTED_LANGUAGES:
+		return f"Unsupported hl '{hl}'. Allowed: {sorted(SUPPORTED_LANGUAGES)}"
+	if gl and gl.upper() not in SUPPORTED_LOCATIONS:
+		return f"Unsupported gl '{gl}'. Use an ISO 3166-1 alpha-2 country code supported by YouTube Music"
+	return None
+
+
+def _guard_session(session: requests.Session) -> None:
+	"""Route every request ``session`` sends through the ``ytmusic`` upstream, timing each page separately."""
+	send = session.send
+
+	def guarded_send(prepared, **kwargs):
+		return get_upstream("ytmusic").call(lambda: send(prepared, **kwargs), http_failed)
+
+	session.send = guarded_send
+
+
+# ytmusicapi reports non-2xx responses as "Server returned HTTP <status>: ..."
+_HTTP_STATUS_RE = re.compile(r"HTTP (\d{3})")
+
+
+def _client_failed(exc: Exception) -> bool:
+	"""Whether ``exc`` says the client or upstream is unhealthy, rather than the call being bad."""
+	if isinstance(exc, requests.RequestException):
+		return True
+	if isinstance(exc, YTMusicServerError):
+		match = _HTTP_STATUS_RE.search(str(exc))
+		return match is not None and (int(match.group(1)) == 429 or int(match.group(1)) >= 500)
+	return False
+
+
+class PooledClient:
+	"""Proxy for a leased YTMusic client that tracks consecutive failed calls (see ``_client_failed``).
+
+	Each HTTP request the client sends goes through the ``ytmusic`` upstream's
+	bulkhead and circuit breaker.
+	"""
+
+	__slots__ = ("client", "locale", "created_at", "errors", "calls")
+
+	def __init__(self, client: Any, locale: Locale):
+		session = getattr(client, "_session", None)
+		if isinstance(session, requests.Session):
+			_guard_session(session)
+		self.client = client
+		self.locale = locale
+		self.created_at = time.time()
+		self.errors = 0
+		self.calls = 0
+
+	def __getattr__(self, name: str) -> Any:
+		attr = getattr(self.client, name)
+		if not callable(attr):
+			return attr
+
+		def call(*args, **kwargs):
+			self.calls += 1
+			try:
+				result = attr(*args, **kwargs)
+			except UpstreamUnavailable:
+				# Rejected before reaching the client
+				raise
+			except Exception as e:
+				# A call rejected for its own arguments still got an answer from upstream
+				self.errors = self.errors + 1 if _client_failed(e) else 0
+				raise
+			self.errors = 0
+			return result
+
+		return call
+
+
+def _new_client(hl: str, gl: str) -> YTMusic:
+	# Unauthenticated client (no OAuth or cookies)
+	# See: https://ytmusicapi.readthedocs.io/en/stable/
+	return YTMusic(language=hl, location=gl)
+
+
+class YTMusicPool:
+	"""Thread-safe, per-locale pool of YTMusic clients."""
+
+	def __init__(
+		self,
+		factory: Callable[[str, str], Any] = _new_client,
+		size: int = 16,
+		lease_timeout: float = 10,
+		max_errors: int = 3,
+		max_age: float = 3600,
+		max_locales: int = 8,
+	):
+		self.factory = factory
+		self.size = size
+		self.max_locales = max_locales
+		self.lease_timeout = lease_timeout
+		self.max_errors = max_errors
+		self.max_age = max_age
+		self._idle: Dict[Locale, List[PooledClient]] = {}
+		self._counts: Dict[Locale, int] = {}
+		self._recycled: Dict[Locale, int] = {}
+		self._last_used: Dict[Locale, float] = {}
+		self._cond = threading.Condition()
+
+	def healthy(self, pooled: PooledClient) -> bool:
+		return pooled.errors < self.max_errors and time.time() - pooled.created_at < self.max_age
+
+	def _discard(self, pooled: PooledClient) -> None:
+		# Caller holds the lock
+		self._counts[pooled.locale] -= 1
+		self._recycled[pooled.locale] = self._recycled.get(pooled.locale, 0) + 1
+		session = getattr(pooled.client, "_session", None)
+		if isinstance(session, requests.Session):
+			session.close()
+
+	def _make_room(self, locale: Locale) -> None:
+		# Caller holds the lock; drops least recently used fully idle locales until ``locale`` fits
+		while True:
+			active = [other for other, count in self._counts.items() if count]
+			if locale in active or len(active) < self.max_locales:
+				return
+			idle = [other for other in active if len(self._idle.get(other, [])) == self._counts[other]]
+			if not idle:
+				raise PoolExhausted(f"all {self.max_locales} client locales are busy")
+			victim = min(idle, key=lambda other: self._last_used.get(other, 0))
+			for pooled in self._idle.pop(victim):
+				self._discard(pooled)
+			del self._counts[victim]
+
+	def lease(self, hl: str, gl: str) -> PooledClient:
+		"""Take a healthy client for ``hl``/``gl``, creating one while below ``size``."""
+		locale = (hl, gl)
+		deadline = time.monotonic() + self.lease_timeout
+		with self._cond:
+			self._make_room(locale)
+			self._last_used[locale] = time.monotonic()
+			while True:
+				idle = self._idle.setdefault(locale, [])
+				while idle:
+					pooled = idle.pop()
+					if self.healthy(pooled):
+						return pooled
+					self._discard(pooled)
+				if self._counts.get(locale, 0) < self.size:
+					self._counts[locale] = self._counts.get(locale, 0) + 1
+					break
+				remaining = deadline - time.monotonic()
+				if remaining <= 0:
+					raise PoolExhausted(f"no client free for locale {hl}/{gl or '-'}")
+				self._cond.wait(remaining)
+		try:
+			return PooledClient(self.factory(hl, gl), locale)
+		except Exception:
+			with self._cond:
+				self._counts[locale] -= 1
+				self._cond.notify()
+			raise
+
+	def release(self, pooled: PooledClient) -> None:
+		with self._cond:
+			if self.healthy(pooled):
+				self._idle.setdefault(pooled.locale, []).append(pooled)
+			else:
+				self._discard(pooled)
+			self._cond.notify()
+
+	def stats(self) -> Dict[str, Dict[str, int]]:
+		with self._cond:
+			return {
+				f"{hl}/{gl or '-'}": {
+					"clients": count,
+					"idle": len(self._idle.get((hl, gl), [])),
+					"recycled": self._recycled.get((hl, gl), 0),
+				}
+				for (hl, gl), count in self._counts.items()
+				if count or (hl, gl) in self._recycled
+			}
+
+
+def current_locale() -> Locale:
+	"""Locale of the current request (``hl``/``gl`` query parameters), or the one pinned in ``g``."""
+	if has_app_context() and g.get("ytmusic_locale"):
+		return g.ytmusic_locale
+	if has_request_context():
+		return (
+			request.args.get("hl") or DEFAULT_LOCALE[0],
+			(request.args.get("gl") or DEFAULT_LOCALE[1]).upper(),
+		)
+	return DEFAULT_LOCALE
+
+
+def lease_client() -> PooledClient:
+	"""The client leased by the current app context, leasing one on first use."""
+	pooled = g.get("ytmusic_lease")
+	if pooled is None:
+		pooled = current_app.config["YTMUSIC_POOL"].lease(*current_locale())
+		g.ytmusic_lease = pooled
+	return pooled
+
+
+def init_ytmusic_pool(app) -> YTMusicPool:
+	"""Attach a client pool (configured from the environment) to ``app`` and release leases on teardown."""
+	pool = YTMusicPool(
+		size=int(os.environ.get("YTMUSIC_POOL_SIZE", 16)),
+		lease_timeout=float(os.environ.get("YTMUSIC_LEASE_TIMEOUT", 10)),
+		max_errors=int(os.environ.get("YTMUSIC_MAX_ERRORS", 3)),
+		max_age=float(os.environ.get("YTMUSIC_MAX_AGE", 3600)),
+		max_locales=int(os.environ.get("YTMUSIC_MAX_LOCALES", 8)),
+	)
+	app.config["YTMUSIC_POOL"] = pool
+
+	@app.before_request
+	def validate_ytmusic_locale():
+		# YTMusic() raises on unsupported values, which would surface as a 500
+		error = locale_error(request.args.get("hl"), request.args.get("gl"))
+		if error:
+			return jsonify({"error": error}), 400
+
+	@app.teardown_appcontext
+	def release_ytmusic_client(exc: Optional[BaseException]) -> None:
+		pooled = g.pop("ytmusic_lease", None)
+		if pooled is not None:
+			current_app.config["YTMUSIC_POOL"].release(pooled)
+
+	return pool